@@ -0,0 +1,314 @@
+from rdflib import Literal
+from rdflib.namespace import RDFS, SDO
+from create_kg import NIF, RDAIO, iter_csv, index_uses
+from collections import defaultdict
+from decimal import Decimal
+from kg_cache import graph_cache_path
+from versioned_store import graph_version
+from profiler import profiled, stage
+import numpy as np
+import weakref
+import os
+
+class AnnotationTable:
+    '''
+    This class stores the numeric annotations of the knowledge graph as integer-coded columns.
+
+    Each column has one entry per annotation:
+        pair: code of the annotation label (index in pair_lbls, the codes follow the sort order of the labels)
+        lemma: code of the lemma (index in lemmas)
+        annotator: code of the annotator (index in annotators)
+        category: annotated category
+        year1, year2: years of the two annotated sentences
+        valid: whether the two annotated words belong to different sentences
+
+    annotator_rank gives the position of each annotator in the graph, it defines the order of the annotators in category_stats().
+    '''
+    def __init__(self, pair_lbls, lemmas, annotators, pair, lemma, annotator, category, year1, year2, valid, annotator_rank):
+        self.pair_lbls = pair_lbls
+        self.lemmas = lemmas
+        self.annotators = annotators
+        self.pair = pair
+        self.lemma = lemma
+        self.annotator = annotator
+        self.category = category
+        self.year1 = year1
+        self.year2 = year2
+        self.valid = valid
+        self.annotator_rank = annotator_rank
+
+    def __len__(self):
+        return len(self.pair)
+
+    def pair_variation(self):
+        '''
+        This function computes the variation of the categories per annotation label (see query_kg.num_labels()).
+
+        Only annotations of words in different sentences are counted.
+
+        @returns
+            pair_codes: codes of the annotation labels
+            num_distinct_lbls: number of distinct categories per annotation label
+            num_total_lbls: number of annotations per annotation label
+            lbl_range: difference between the highest and the lowest category per annotation label
+        '''
+        pair = self.pair[self.valid]
+        category = self.category[self.valid]
+
+        # group the annotations by their label
+        order = np.lexsort((category, pair))
+        pair = pair[order]
+        category = category[order]
+        group_start = np.flatnonzero(np.concatenate(([True], pair[1:] != pair[:-1])))
+        pair_codes = pair[group_start]
+        num_total_lbls = np.diff(np.append(group_start, len(pair)))
+
+        # the categories are sorted within a group: a new distinct category starts wherever the value changes
+        new_category = np.concatenate(([True], (pair[1:] != pair[:-1]) | (category[1:] != category[:-1])))
+        num_distinct_lbls = np.add.reduceat(new_category, group_start) if len(pair) else np.zeros(0, dtype=np.int64)
+
+        group_end = np.append(group_start[1:], len(pair)) - 1
+        lbl_range = category[group_end] - category[group_start]
+        return pair_codes, num_distinct_lbls, num_total_lbls, lbl_range
+
+    def category_stats(self):
+        '''
+        This function computes the frequencies of the categories (see query_kg.category_stats()).
+
+        @returns rows: list of (category, num_annotated, num_distinct_sentence_pairs, num_annotators, annotators) tuples
+        '''
+        rows = []
+        for category in np.unique(self.category):
+            mask = self.category == category
+            # annotators in the order of the graph (like GROUP_CONCAT in rdflib)
+            annotator_codes = np.unique(self.annotator[mask])
+            annotators = [self.annotators[code] for code in annotator_codes[np.argsort(self.annotator_rank[annotator_codes])]]
+            rows.append((int(category), int(mask.sum()), len(np.unique(self.pair[mask])), len(annotators), " | ".join(annotators)))
+        return rows
+
+class PairVariation:
+    '''
+    This class is the materialized view of the variation per annotation label (the result of query_kg.num_labels()).
+
+    The rows are ordered by num_distinct_lbls, num_total_lbls, range and annotation_lbl, so every filtered subset keeps this order.
+    '''
+    def __init__(self, annotation_lbls, num_distinct_lbls, num_total_lbls, lbl_range):
+        self.annotation_lbls = annotation_lbls
+        self.num_distinct_lbls = num_distinct_lbls
+        self.num_total_lbls = num_total_lbls
+        self.lbl_range = lbl_range
+
+    def __len__(self):
+        return len(self.annotation_lbls)
+
+    def mask(self, start = None, end = None):
+        '''
+        This function selects the annotation labels by their number of distinct labels.
+
+        @params
+            start: minimal number of distinct labels (None: no minimum)
+            end: maximal number of distinct labels (None: no maximum)
+        @returns mask: boolean array of the selected rows
+        '''
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.num_distinct_lbls >= start
+        if end is not None:
+            mask &= self.num_distinct_lbls <= end
+        return mask
+
+    def save(self, path):
+        '''
+        This function stores the view in a npz file.
+
+        @param path: path of the npz file
+        '''
+        np.savez(path, annotation_lbls=self.annotation_lbls, num_distinct_lbls=self.num_distinct_lbls, num_total_lbls=self.num_total_lbls, lbl_range=self.lbl_range)
+
+    @staticmethod
+    def load(path):
+        '''
+        This function loads a view stored with save().
+
+        @param path: path of the npz file
+        @returns view: PairVariation
+        '''
+        with np.load(path) as arrays:
+            return PairVariation(arrays["annotation_lbls"], arrays["num_distinct_lbls"], arrays["num_total_lbls"], arrays["lbl_range"])
+
+    @staticmethod
+    def from_table(table):
+        '''
+        This function computes the view from an annotation table.
+
+        @param table: AnnotationTable
+        @returns view: PairVariation
+        '''
+        pair_codes, num_distinct_lbls, num_total_lbls, lbl_range = table.pair_variation()
+
+        # ORDER BY ?num_distinct_lbls ?num_total_lbls ?range ?annotation_lbl (the codes follow the order of the labels)
+        order = np.lexsort((pair_codes, lbl_range, num_total_lbls, num_distinct_lbls))
+        annotation_lbls = np.array(table.pair_lbls, dtype=str)[pair_codes[order]] if len(order) else np.zeros(0, dtype=str)
+        return PairVariation(annotation_lbls, num_distinct_lbls[order].astype(np.int32), num_total_lbls[order].astype(np.int32), lbl_range[order].astype(np.int32))
+
+def encode_column(values):
+    '''
+    This function turns a list of strings into integer codes.
+
+    @param values: list of strings
+    @returns
+        labels: sorted list of the distinct strings
+        codes: array with the index of each value in labels
+    '''
+    labels = sorted(set(values))
+    label2code = {label: code for code, label in enumerate(labels)}
+    return labels, np.fromiter((label2code[value] for value in values), dtype=np.int32, count=len(values))
+
+def make_table(pair_lbls, lemmas, annotators, categories, years1, years2, valid, annotator_order = None):
+    '''
+    This function creates an annotation table from one list per column.
+
+    @params
+        pair_lbls: annotation label per annotation
+        lemmas: lemma per annotation
+        annotators: annotator name per annotation
+        categories: category per annotation
+        years1, years2: years of the sentences per annotation
+        valid: whether the words of the annotation belong to different sentences
+        annotator_order: list of the annotators in the order of the graph (default: order of their first annotation)
+    @returns table: AnnotationTable
+    '''
+    if annotator_order is None:
+        annotator_order = list(dict.fromkeys(annotators))
+    pair_lbls, pair = encode_column(pair_lbls)
+    lemmas, lemma = encode_column(lemmas)
+    annotators, annotator = encode_column(annotators)
+    annotator_rank = {name: rank for rank, name in enumerate(annotator_order)}
+    annotator_rank = np.array([annotator_rank.get(name, len(annotator_rank)) for name in annotators], dtype=np.int32)
+    return AnnotationTable(pair_lbls, lemmas, annotators, pair, lemma, annotator,
+                           np.array(categories, dtype=np.int16), np.array(years1, dtype=np.int16), np.array(years2, dtype=np.int16), np.array(valid, dtype=bool), annotator_rank)
+
+def is_numeric(term):
+    '''
+    This function checks whether a term is a numeric literal (like isNumeric() in SPARQL).
+
+    @param term: RDF term
+    @returns is_numeric: True if the term is a numeric literal
+    '''
+    return isinstance(term, Literal) and not isinstance(term.value, bool) and isinstance(term.value, (int, float, Decimal))
+
+@profiled("annotation_table")
+def table_from_graph(g):
+    '''
+    This function builds the annotation table from the knowledge graph.
+
+    @param g: RDF-graph
+    @returns table: AnnotationTable of the annotations with a numeric category
+    '''
+    labels = dict(g.subject_objects(RDFS.label))
+    annotator_of = dict(g.subject_objects(RDAIO.P40015))
+    lemma_of = dict(g.subject_objects(NIF.lemma))
+    sentence_of = dict(g.subject_objects(NIF.referenceContext))
+    year_of = dict(g.subject_objects(SDO.observationDate))
+    words_of = defaultdict(list)
+    for word, annotation in g.subject_objects(NIF.annotation):
+        words_of[annotation].append(word)
+
+    pair_lbls, lemmas, annotators, categories, years1, years2, valid = [], [], [], [], [], [], []
+    for annotation, category in g.subject_objects(NIF.category):
+        if not is_numeric(category) or annotation not in labels or annotator_of.get(annotation) not in labels:
+            continue
+        sentences = [sentence_of.get(word) for word in words_of[annotation]] or [None]
+        pair_lbls.append(str(labels[annotation]))
+        lemmas.append(str(lemma_of.get(words_of[annotation][0], "")) if words_of[annotation] else "")
+        annotators.append(str(labels[annotator_of[annotation]]))
+        categories.append(int(category.value))
+        years1.append(int(str(year_of.get(sentences[0], 0))))
+        years2.append(int(str(year_of.get(sentences[-1], 0))))
+        valid.append(len(set(labels.get(sentence) for sentence in sentences)) > 1)
+
+    annotator_order = [str(labels.get(annotator_uri, "")) for annotator_uri in dict.fromkeys(annotator_of.values())]
+    return make_table(pair_lbls, lemmas, annotators, categories, years1, years2, valid, annotator_order)
+
+def table_from_csv(data_path = "./dwug_en/data", annotated_words = None):
+    '''
+    This function builds the annotation table directly from the csv files of the dataset without creating the graph.
+
+    @params
+        data_path: path to the data folder
+        annotated_words: list of words that should be included (default: words annotated by all annotators)
+    @returns table: AnnotationTable of the annotations
+    '''
+    if annotated_words is None:
+        from explore_data import find_variation_words
+        annotated_words = find_variation_words()
+
+    pair_lbls, lemmas, annotators, categories, years1, years2, valid = [], [], [], [], [], [], []
+    for lemma in sorted(set(annotated_words).intersection(set(os.listdir(data_path)))):
+        uses_index = index_uses(f"{data_path}/{lemma}/uses.csv")
+
+        # same labels as the word nodes in create_kg
+        word_lbls = {sentence_id: f"{use.token}_{sentence_id}" for sentence_id, use in uses_index.items()}
+
+        for judgment_row in iter_csv(f"{data_path}/{lemma}/judgments.csv"):
+            sentence1_id, sentence2_id = judgment_row["identifier1"], judgment_row["identifier2"]
+            pair_lbls.append(f"{word_lbls[sentence1_id]}_{word_lbls[sentence2_id]}")
+            lemmas.append(lemma)
+            annotators.append(judgment_row["annotator"])
+            categories.append(int(judgment_row["judgment"]))
+            years1.append(int(uses_index[sentence1_id].date))
+            years2.append(int(uses_index[sentence2_id].date))
+            valid.append(sentence1_id != sentence2_id)
+
+    return make_table(pair_lbls, lemmas, annotators, categories, years1, years2, valid)
+
+# tables of the graphs in this session: id(graph) -> (weak reference to the graph, version of the graph, table)
+_tables = dict()
+
+def get_annotation_table(g):
+    '''
+    This function returns the annotation table of a graph and only builds it if the graph is new or has changed (see versioned_store.graph_version()).
+
+    @param g: RDF-graph
+    @returns table: AnnotationTable of the graph
+    '''
+    version = graph_version(g)
+    cached = _tables.get(id(g))
+    if version is not None and cached is not None and cached[0]() is g and cached[1] == version:
+        return cached[2]
+
+    table = table_from_graph(g)
+    if version is not None:
+        _tables[id(g)] = (weakref.ref(g), version, table)
+    return table
+
+# views of the graphs in this session: id(graph) -> (weak reference to the graph, version of the graph, view)
+_views = dict()
+
+def get_pair_variation(g):
+    '''
+    This function returns the pair variation view of a graph.
+
+    The view is computed once per version of the graph (see versioned_store.graph_version()). If the graph has been loaded with kg_cache.load_kg(), the view is stored next to the cache file and reused in later sessions.
+
+    @param g: RDF-graph
+    @returns view: PairVariation of the graph
+    '''
+    version = graph_version(g)
+    cached = _views.get(id(g))
+    if version is not None and cached is not None and cached[0]() is g and cached[1] == version:
+        return cached[2]
+
+    cache_path = graph_cache_path(g)
+    view_path = f"{os.path.splitext(cache_path)[0]}_variation.npz" if cache_path is not None else None
+    with stage("pair_variation"):
+        if view_path is not None and os.path.isfile(view_path):
+            view = PairVariation.load(view_path)
+        else:
+            view = PairVariation.from_table(get_annotation_table(g))
+            if view_path is not None:
+                view.save(view_path)
+
+    if version is not None:
+        _views[id(g)] = (weakref.ref(g), version, view)
+    return view
@@ -0,0 +1,269 @@
+from concurrent.futures import ProcessPoolExecutor
+from rdflib import Graph
+from profiler import peak_rss, current_rss
+import multiprocessing
+import numpy as np
+import platform
+import tempfile
+import rdflib
+import json
+import time
+import csv
+import os
+
+# columns of the csv files of DWUG EN
+USES_COLUMNS = ["lemma", "pos", "date", "grouping", "identifier", "description", "context", "indexes_target_token", "indexes_target_sentence", "context_tokenized", "indexes_target_token_tokenized", "indexes_target_sentence_tokenized", "context_lemmatized", "context_pos"]
+JUDGMENTS_COLUMNS = ["identifier1", "identifier2", "annotator", "judgment", "comment", "lemma", "round"]
+
+# sizes of the synthetic datasets (dwug: about the size of DWUG EN)
+SIZES = {
+    "small": {"num_lemmas": 4, "num_uses": 50, "num_judgments": 200, "num_annotators": 13},
+    "medium": {"num_lemmas": 12, "num_uses": 100, "num_judgments": 600, "num_annotators": 13},
+    "dwug": {"num_lemmas": 46, "num_uses": 200, "num_judgments": 1500, "num_annotators": 13},
+}
+
+# a stage is a regression if it takes this many times as long (or as much memory) as in the baseline
+TIME_THRESHOLD = 1.25
+MEMORY_THRESHOLD = 1.25
+# stages that are faster than this are not compared (their timings are mostly noise)
+MIN_SECONDS = 0.05
+# stages whose memory grows less than this (in MB) are not compared by memory
+MIN_MEGABYTES = 10
+
+# words of the synthetic sentences
+VOCABULARY = ["the", "a", "of", "and", "in", "to", "was", "he", "she", "it", "that", "with", "his", "her", "on", "for", "at", "by", "from", "old", "new", "long", "little", "house", "day", "man", "woman", "water", "light", "time", "came", "went", "saw", "took", "made"]
+
+def generate_dataset(path, num_lemmas = 4, num_uses = 50, num_judgments = 200, num_annotators = 13, judgments_per_pair = 2, seed = 0):
+    '''
+    This function writes a synthetic dataset in the format of DWUG EN (one folder with uses.csv and judgments.csv per lemma).
+
+    Every word pair is judged by several annotators, their labels differ from each other in some pairs, so that the variation queries have results.
+
+    @params
+        path: data folder of the dataset
+        num_lemmas: number of lemmas
+        num_uses: number of uses per lemma
+        num_judgments: number of judgments per lemma
+        num_annotators: number of annotators
+        judgments_per_pair: number of annotators who judge each word pair
+        seed: seed of the random generator
+    @returns lemmas: list of the lemmas
+    '''
+    rng = np.random.default_rng(seed)
+    lemmas = [f"lemma{i:04d}_{'vb' if i % 4 == 3 else 'nn'}" for i in range(num_lemmas)]
+    judgments_per_pair = min(judgments_per_pair, num_annotators)
+
+    for lemma in lemmas:
+        os.makedirs(f"{path}/{lemma}", exist_ok=True)
+        target = lemma.rsplit("_", 1)[0]
+        identifiers = [f"{rng.choice(['fic', 'mag', 'nf', 'news'])}_{rng.integers(1810, 2010)}_{i}.txt-{rng.integers(1, 3000)}-{rng.integers(1, 40)}" for i in range(num_uses)]
+
+        with open(f"{path}/{lemma}/uses.csv", "w", encoding="utf-8", newline="") as uses_file:
+            writer = csv.writer(uses_file, delimiter="\t", quoting=csv.QUOTE_NONE, escapechar="\\")
+            writer.writerow(USES_COLUMNS)
+            for identifier in identifiers:
+                tokens = list(rng.choice(VOCABULARY, size=rng.integers(8, 30)))
+                position = int(rng.integers(0, len(tokens)))
+                tokens.insert(position, target)
+                context = " ".join(tokens)
+                start = len(" ".join(tokens[:position])) + (position > 0)
+                writer.writerow([lemma, lemma.rsplit("_", 1)[1] + "1", identifier.split("_")[1], 1, identifier, "", context, f"{start}:{start + len(target)}", f"0:{len(context)}", context, position, f"0:{len(tokens)}", context, " ".join(["nn1"] * len(tokens))])
+
+        with open(f"{path}/{lemma}/judgments.csv", "w", encoding="utf-8", newline="") as judgments_file:
+            writer = csv.writer(judgments_file, delimiter="\t")
+            writer.writerow(JUDGMENTS_COLUMNS)
+            for _ in range(max(num_judgments // judgments_per_pair, 1)):
+                use1, use2 = rng.choice(num_uses, size=2, replace=False)
+                category = int(rng.choice(5, p=[0.03, 0.2, 0.2, 0.25, 0.32]))
+                for annotator in rng.choice(num_annotators, size=judgments_per_pair, replace=False):
+                    # some annotators disagree with the others by one label
+                    judgment = int(np.clip(category + rng.choice([-1, 0, 1], p=[0.15, 0.7, 0.15]), 1, 4)) if category else 0
+                    writer.writerow([identifiers[use1], identifiers[use2], f"annotator{annotator}", judgment, "", lemma, 1])
+    return lemmas
+
+class Stages:
+    '''
+    This class times the stages of a benchmark run.
+    '''
+    def __init__(self):
+        self.stages = dict()
+
+    def run(self, name, function, *args, num_triples = None, **kwargs):
+        '''
+        This function runs and times one stage.
+
+        The memory of a stage is the growth of the RSS while it runs. The peak RSS of the process only grows,
+        so it is recorded once per size (see benchmark_size()) instead of per stage.
+
+        @params
+            name: name of the stage
+            function: function of the stage
+            args, kwargs: arguments of the function
+            num_triples: number of triples the stage processes (None: the number of triples is not recorded)
+        @returns result: the result of the function
+        '''
+        rss_start = current_rss()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+
+        self.stages[name] = {"seconds": round(seconds, 4), "rss_delta_mb": round(current_rss() - rss_start, 1)}
+        if num_triples is not None:
+            num_triples = num_triples(result) if callable(num_triples) else num_triples
+            self.stages[name]["triples"] = num_triples
+            self.stages[name]["triples_per_second"] = round(num_triples / seconds, 1) if seconds else None
+        return result
+
+def benchmark_size(size, params, seed = 0, num_instances = 100):
+    '''
+    This function generates one synthetic dataset and times the stages of the pipeline on it (in a temporary folder).
+
+    @params
+        size: name of the size
+        params: parameters of generate_dataset()
+        seed: seed of the dataset
+        num_instances: maximal number of word pairs of the instance stage
+    @returns result: dictionary of the size and the stages
+    '''
+    import query_kg
+    import visualize_kg
+    from create_kg import create_kg, create_dataset
+    from render_kg import use_agg
+
+    use_agg()
+    stages = Stages()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            for folder in ["graphs", "query_results/annotator", "query_results/variation", "visualizations/full", "visualizations/annotator/distinct", "visualizations/annotator/range", "visualizations/instance"]:
+                os.makedirs(folder, exist_ok=True)
+            lemmas = stages.run("generate", generate_dataset, "./data", seed=seed, **params)
+
+            g = stages.run("build", create_kg, data_path="./data", dataset_name="benchmark", annotated_words=lemmas, serialize=False, num_triples=len)
+            num_triples = len(g)
+            stages.run("serialize", g.serialize, destination="./graphs/benchmark.ttl", format="turtle", encoding="utf-8", num_triples=num_triples)
+            stages.run("parse", Graph().parse, "./graphs/benchmark.ttl", format="turtle", num_triples=len)
+
+            stages.run("annotation_table", lambda: (query_kg.get_annotation_table(g), query_kg.get_pair_variation(g)))
+            stages.run("query:category_stats", query_kg.category_stats, g)
+            stages.run("query:annotations_per_annotators", query_kg.annotations_per_annotators, g)
+            stages.run("query:num_labels", query_kg.num_labels, g)
+            rows = stages.run("query:filter_variation", query_kg.filter_variation, g, 2)
+            stages.run("query:pos_tags", query_kg.get_pos_tags, g)
+
+            pos = stages.run("layout", visualize_kg.create_annotation_pos, g)
+            stages.run("visualize:full", visualize_kg.create_full_annotation_vis, g, pos, "distinct")
+            stages.run("visualize:annotator", visualize_kg.create_single_annotator_vis, g, "annotator0", pos, "distinct")
+            pairs = visualize_kg.annotation_pairs(g, [row.annotation_lbl for row in rows][:num_instances])
+            stages.run("instance_graphs", visualize_kg.inspect_instances, g, pairs, draw=False)
+
+            # the graphs of two datasets share the annotator nodes, the engines have to agree on their union
+            # (not timed, two small datasets are enough and the SPARQL engine is too slow for the larger sizes)
+            datasets = {"check": {"data_path": "./check", "language": "en"}, "check_other": {"data_path": "./check_other", "language": "en"}}
+            annotated_words = {name: generate_dataset(dataset["data_path"], seed=seed + i, **SIZES["small"]) for i, (name, dataset) in enumerate(datasets.items())}
+            ds = create_dataset(list(datasets), annotated_words=annotated_words, datasets=datasets)
+            mismatches = query_kg.engine_mismatches(query_kg.select_datasets(ds, list(datasets)))
+        finally:
+            os.chdir(cwd)
+
+    return {"size": size, "params": params, "seed": seed, "triples": num_triples, "peak_rss_mb": round(peak_rss(), 1), "engine_mismatches": mismatches, "stages": stages.stages}
+
+def run_benchmarks(sizes = ("small",), seed = 0, num_instances = 100):
+    '''
+    This function benchmarks the pipeline at several sizes.
+
+    Each size runs in a separate process, so that the peak RSS of a size does not include the memory of the previous sizes.
+
+    @params
+        sizes: list of the names of the sizes in SIZES
+        seed: seed of the datasets
+        num_instances: maximal number of word pairs of the instance stage
+    @returns results: dictionary of the environment and the results per size
+    '''
+    results = {"python": platform.python_version(), "rdflib": rdflib.__version__, "numpy": np.__version__, "platform": platform.platform(), "results": []}
+
+    start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    for size in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(start_method)) as executor:
+            result = executor.submit(benchmark_size, size, SIZES[size], seed, num_instances).result()
+        results["results"].append(result)
+    return results
+
+def compare_results(baseline, results, time_threshold = TIME_THRESHOLD, memory_threshold = MEMORY_THRESHOLD, min_seconds = MIN_SECONDS, min_megabytes = MIN_MEGABYTES):
+    '''
+    This function compares the results of a benchmark run with the results of an earlier run.
+
+    The stages are compared by their time and the growth of the RSS, the peak RSS is compared once per size (stage "total").
+
+    @params
+        baseline: results of the earlier run (see run_benchmarks())
+        results: results of the current run
+        time_threshold: maximal ratio of the time of a stage to the baseline
+        memory_threshold: maximal ratio of the memory of a stage (or the peak RSS of a size) to the baseline
+        min_seconds: stages that are faster than this in both runs are not compared by time
+        min_megabytes: stages whose RSS grows less than this in both runs are not compared by memory
+    @returns regressions: list of the stages that exceed a threshold
+    '''
+    baseline_results = {result["size"]: result for result in baseline["results"]}
+
+    regressions = []
+    def check(size, name, metric, old_value, value, threshold):
+        if old_value and old_value > 0 and value / old_value > threshold:
+            regressions.append({"size": size, "stage": name, "metric": metric, "baseline": old_value, "current": value, "ratio": round(value / old_value, 2)})
+
+    for result in results["results"]:
+        old_result = baseline_results.get(result["size"])
+        if old_result is None:
+            continue
+        check(result["size"], "total", "peak_rss_mb", old_result["peak_rss_mb"], result["peak_rss_mb"], memory_threshold)
+        for name, stage in result["stages"].items():
+            old_stage = old_result["stages"].get(name)
+            if old_stage is None:
+                continue
+            if max(stage["seconds"], old_stage["seconds"]) >= min_seconds:
+                check(result["size"], name, "seconds", old_stage["seconds"], stage["seconds"], time_threshold)
+            if max(stage["rss_delta_mb"], old_stage["rss_delta_mb"]) >= min_megabytes:
+                check(result["size"], name, "rss_delta_mb", max(old_stage["rss_delta_mb"], min_megabytes), max(stage["rss_delta_mb"], min_megabytes), memory_threshold)
+    return regressions
+
+def benchmark(sizes = ("small",), output = "./benchmarks/results.json", baseline = None, time_threshold = TIME_THRESHOLD, memory_threshold = MEMORY_THRESHOLD, seed = 0):
+    '''
+    This function runs the benchmarks, compares them with a baseline and stores the results as JSON.
+
+    @params
+        sizes: list of the names of the sizes in SIZES
+        output: path of the JSON file
+        baseline: path of the JSON file of an earlier run (None: no comparison)
+        time_threshold, memory_threshold: see compare_results()
+        seed: seed of the datasets
+    @returns regressions: list of the stages that exceed a threshold and of the queries whose engines disagree
+    '''
+    results = run_benchmarks(sizes, seed)
+
+    regressions = []
+    if baseline is not None:
+        with open(baseline, encoding="utf-8") as baseline_file:
+            regressions = compare_results(json.load(baseline_file), results, time_threshold, memory_threshold)
+        results["thresholds"] = {"seconds": time_threshold, "memory": memory_threshold, "min_seconds": MIN_SECONDS, "min_megabytes": MIN_MEGABYTES}
+        results["regressions"] = regressions
+
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=2)
+
+    for result in results["results"]:
+        print(f"\n{result['size']}: {result['triples']} triples, peak RSS {result['peak_rss_mb']:.1f} MB")
+        for name, stage in result["stages"].items():
+            print(f"    {name:<36}{stage['seconds']:>10.3f} s{stage['rss_delta_mb']:>+10.1f} MB")
+    for regression in regressions:
+        print(f"regression: {regression['size']} {regression['stage']} {regression['metric']} {regression['baseline']} -> {regression['current']} (x{regression['ratio']})")
+
+    mismatches = [{"size": result["size"], "query": name} for result in results["results"] for name in result["engine_mismatches"]]
+    for mismatch in mismatches:
+        print(f"engine mismatch: {mismatch['size']} {mismatch['query']} (the table and the SPARQL engine differ on the union of two datasets)")
+    return regressions + mismatches
+
+if __name__ == "__main__":
+    benchmark()
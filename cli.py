@@ -0,0 +1,200 @@
+import argparse
+
+# The subcommands import the scripts they need themselves, so that e.g. a query does not import the visualization libraries.
+
+def load_graph(args):
+    '''
+    This function loads the graph of a subcommand: the serialized graph given with --graph or the (cached) knowledge graph.
+
+    @param args: parsed command line arguments
+    @returns g: RDF-graph
+    '''
+    if args.graph is not None:
+        from kg_cache import read_kg
+        return read_kg(args.graph)
+
+    from kg_cache import load_kg
+    return load_kg(data_path=args.data_path, dataset_name=args.dataset_name, annotated_words=args.words, language=args.language, store_path=args.store)
+
+def build(args):
+    '''
+    This function creates the knowledge graph.
+
+    @param args: parsed command line arguments
+    '''
+    if args.datasets:
+        from create_kg import create_dataset
+        create_dataset(dataset_names=args.datasets, num_workers=args.workers, serialize=True, graph_path=f"./graphs/{'_'.join(args.datasets)}.trig{args.compression}")
+    elif args.stream:
+        from create_kg import stream_kg
+        stream_kg(data_path=args.data_path, dataset_name=args.dataset_name, annotated_words=args.words, language=args.language, num_workers=args.workers, to_turtle=args.to_turtle, nt_path=f"./graphs/{args.dataset_name}.nt{args.compression}")
+    else:
+        from kg_cache import load_kg
+        load_kg(data_path=args.data_path, dataset_name=args.dataset_name, annotated_words=args.words, language=args.language, num_workers=args.workers, serialize=True, store_path=args.store, graph_path=f"./graphs/{args.dataset_name}.ttl{args.compression}")
+
+def query(args):
+    '''
+    This function runs one of the queries in query_kg.py.
+
+    @param args: parsed command line arguments
+    '''
+    import query_kg
+
+    query_kg.RESULT_COMPRESSION = args.compression
+    query_kg.RESULT_FORMATS = args.formats
+    if args.datasets:
+        # the Dataset stored by build --datasets (or the TriG file given with --graph), it is only built if there is none
+        from create_kg import load_dataset
+        g = query_kg.select_datasets(load_dataset(dataset_names=args.datasets, graph_path=args.graph), args.datasets)
+    else:
+        g = load_graph(args)
+    if args.query == "category_stats":
+        query_kg.category_stats(g)
+    elif args.query == "annotations_per_annotator":
+        query_kg.annotations_per_annotators(g, annotators=args.annotators)
+    elif args.query == "num_labels":
+        query_kg.num_labels(g)
+    elif args.query == "filter_variation":
+        query_kg.filter_variation(g, start=args.start, end=args.end)
+    elif args.query == "pos_tags":
+        query_kg.get_pos_tags(g)
+
+def visualize(args):
+    '''
+    This function creates the visualizations in visualize_kg.py.
+
+    @param args: parsed command line arguments
+    '''
+    import visualize_kg
+
+    g = load_graph(args)
+    if args.level == "instance" and args.variation is not None:
+        from query_kg import variation_rows
+        pairs = visualize_kg.annotation_pairs(g, [row.annotation_lbl for row in variation_rows(g, args.variation)])
+        visualize_kg.inspect_instances(g, pairs, num_workers=args.workers or None)
+        return
+    if args.level == "instance":
+        visualize_kg.inspect_instance(g, args.pair)
+        return
+
+    from render_kg import render_visualizations
+    if args.level == "full":
+        render_visualizations(g, color_modes=args.color_modes, full=True, num_workers=args.workers)
+    else:
+        render_visualizations(g, color_modes=args.color_modes, full=False, annotators=args.annotators, num_workers=args.workers)
+
+def serve(args):
+    '''
+    This function starts the local query service of serve_kg.py.
+
+    @param args: parsed command line arguments
+    '''
+    from serve_kg import serve_kg
+
+    g = load_graph(args)
+    serve_kg(g, host=args.host, port=args.port, num_workers=args.workers, timeout=args.timeout)
+
+def stats(args):
+    '''
+    This function prints statistics about the original dataset.
+
+    @param args: parsed command line arguments
+    '''
+    import explore_data
+
+    variation_words = explore_data.find_variation_words()
+    explore_data.compute_avg_num_uses()
+    if args.annotations:
+        explore_data.num_annotations(include = variation_words)
+
+def run_benchmark(args):
+    '''
+    This function runs the benchmarks of benchmark.py on synthetic datasets.
+
+    @param args: parsed command line arguments
+    '''
+    from benchmark import benchmark
+
+    regressions = benchmark(sizes=args.sizes, output=args.output, baseline=args.baseline, time_threshold=args.time_threshold, memory_threshold=args.memory_threshold, seed=args.seed)
+    if regressions:
+        raise SystemExit(1)
+
+def parse_args(argv = None):
+    '''
+    This function defines the command line interface.
+
+    @param argv: list of command line arguments (default: sys.argv)
+    @returns args: parsed command line arguments
+    '''
+    graph_args = argparse.ArgumentParser(add_help=False)
+    graph_args.add_argument("--data-path", default="./dwug_en/data", help="path to the data folder")
+    graph_args.add_argument("--dataset-name", default="dwug_en", help="name of the dataset")
+    graph_args.add_argument("--language", default="en", help="language of the dataset")
+    graph_args.add_argument("--words", nargs="+", default=None, help="words that should be included (default: words annotated by all annotators)")
+    graph_args.add_argument("--store", default=None, help="path of an SQLite database the graph is stored in (default: the graph is kept in memory)")
+    graph_args.add_argument("--graph", default=None, help="load this serialized graph instead of building it, .gz and .zst files are decompressed (e.g. graphs/dwug_en.ttl.gz)")
+
+    annotators = [f"annotator{i}" for i in range(13)]
+
+    parser = argparse.ArgumentParser(description="Create, query and visualize the knowledge graph of DWUG EN.")
+    parser.add_argument("--profile", default=None, metavar="DIR", help="write a report of the time and memory of each stage to this folder (see profiler.py)")
+    parser.add_argument("--compression", choices=["", ".gz", ".zst"], default="", help="compress the written graph and query results with gzip (.gz) or zstd (.zst, needs zstandard)")
+    parser.add_argument("--cprofile", action="store_true", help="also store a cProfile dump of each top-level stage in the report folder")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", parents=[graph_args], help="create the knowledge graph")
+    build_parser.add_argument("--workers", type=int, default=1, help="number of processes building the lemmas in parallel (0: number of cores)")
+    build_parser.add_argument("--stream", action="store_true", help="write the triples directly to an N-Triples file")
+    build_parser.add_argument("--datasets", nargs="+", choices=["dwug_en", "dwug_de", "dwug_sv", "dwug_la"], default=None, help="load these datasets as named graphs into one Dataset (one process per dataset) and store it in the TriG format")
+    build_parser.add_argument("--to-turtle", action="store_true", help="convert the streamed N-Triples file into the turtle format")
+    build_parser.set_defaults(func=build)
+
+    query_parser = subparsers.add_parser("query", parents=[graph_args], help="query the knowledge graph")
+    query_parser.add_argument("query", choices=["category_stats", "annotations_per_annotator", "num_labels", "filter_variation", "pos_tags"])
+    query_parser.add_argument("--annotators", nargs="+", default=annotators, help="annotators for annotations_per_annotator")
+    query_parser.add_argument("--start", type=int, default=1, help="minimal number of distinct labels for filter_variation")
+    query_parser.add_argument("--end", type=int, default=None, help="maximal number of distinct labels for filter_variation")
+    query_parser.add_argument("--formats", nargs="+", choices=["csv", "parquet", "arrow"], default=["csv"], help="formats of the stored results (parquet and arrow need pyarrow)")
+    query_parser.add_argument("--datasets", nargs="+", choices=["dwug_en", "dwug_de", "dwug_sv", "dwug_la"], default=None, help="query the union of these datasets instead of one graph (loaded from the TriG file of build --datasets or --graph)")
+    query_parser.set_defaults(func=query)
+
+    visualize_parser = subparsers.add_parser("visualize", parents=[graph_args], help="visualize the knowledge graph")
+    visualize_parser.add_argument("level", choices=["instance", "annotator", "full"])
+    visualize_parser.add_argument("--pair", nargs=2, default=["circled_mag_1856_590750.txt-21-18", "circling_fic_1849_7230.txt-2441-6"], help="word pair for the instance visualization")
+    visualize_parser.add_argument("--variation", type=int, default=None, help="visualize all word pairs with at least this number of distinct labels instead of --pair")
+    visualize_parser.add_argument("--annotators", nargs="+", default=annotators, help="annotators for the annotator visualization")
+    visualize_parser.add_argument("--color-modes", nargs="+", choices=["distinct", "range"], default=["distinct", "range"])
+    visualize_parser.add_argument("--workers", type=int, default=0, help="number of processes rendering the figures (0: number of cores)")
+    visualize_parser.set_defaults(func=visualize)
+
+    serve_parser = subparsers.add_parser("serve", parents=[graph_args], help="answer queries on the knowledge graph over HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address of the service")
+    serve_parser.add_argument("--port", type=int, default=8000, help="port of the service")
+    serve_parser.add_argument("--workers", type=int, default=4, help="number of queries that are evaluated at the same time")
+    serve_parser.add_argument("--timeout", type=float, default=60, help="seconds after which a query is aborted")
+    serve_parser.set_defaults(func=serve)
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="time the pipeline on synthetic datasets")
+    benchmark_parser.add_argument("--sizes", nargs="+", choices=["small", "medium", "dwug"], default=["small"], help="sizes of the synthetic datasets")
+    benchmark_parser.add_argument("--output", default="./benchmarks/results.json", help="path of the JSON file of the results")
+    benchmark_parser.add_argument("--baseline", default=None, help="JSON file of an earlier run, slower stages are reported as regressions")
+    benchmark_parser.add_argument("--time-threshold", type=float, default=1.25, help="maximal ratio of the time of a stage to the baseline")
+    benchmark_parser.add_argument("--memory-threshold", type=float, default=1.25, help="maximal ratio of the RSS growth of a stage (and the peak RSS of a size) to the baseline")
+    benchmark_parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic datasets")
+    benchmark_parser.set_defaults(func=run_benchmark)
+
+    stats_parser = subparsers.add_parser("stats", help="print statistics about the original dataset")
+    stats_parser.add_argument("--annotations", action="store_true", help="also count the annotations (needs data_joint.js)")
+    stats_parser.set_defaults(func=stats)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "workers", 1) == 0:
+        args.workers = None
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.profile is not None:
+        import profiler
+        profiler.enable(args.profile, cprofile=args.cprofile)
+    args.func(args)
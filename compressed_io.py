@@ -0,0 +1,85 @@
+from rdflib.util import guess_format
+from versioned_store import new_graph
+import gzip
+import os
+
+# compression of a file by its extension (e.g. graphs/dwug_en.ttl.gz, query_results/num_labels.csv.zst)
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+# compression levels, lower than the maximum because the graph and the results are written often
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+def compression(path):
+    '''
+    This function chooses the codec of a file from its extension.
+
+    @param path: path of the file
+    @returns codec: gzip, zstd or None (uncompressed)
+    '''
+    return COMPRESSIONS.get(os.path.splitext(path)[1].lower())
+
+def open_file(path, mode = "rb", encoding = None, newline = None):
+    '''
+    This function opens a file like open() and compresses or decompresses it while it is read or written.
+
+    zstd needs the optional package zstandard (pip install zstandard).
+
+    @params
+        path: path of the file, the codec is chosen from its extension (see COMPRESSIONS)
+        mode: mode of the file (e.g. rb, wb, rt, wt)
+        encoding: encoding of a text file
+        newline: newline mode of a text file
+    @returns file: file object
+    '''
+    codec = compression(path)
+    if codec == "gzip":
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL, encoding=encoding, newline=newline)
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"{path} is compressed with zstd, please install zstandard (pip install zstandard)") from None
+        return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL), encoding=encoding, newline=newline)
+    return open(path, mode, encoding=encoding, newline=newline)
+
+def rdf_format(path, default = "turtle"):
+    '''
+    This function chooses the RDF format of a (compressed) graph file from its extension.
+
+    @params
+        path: path of the graph file (e.g. graphs/dwug_en.ttl.gz)
+        default: format of unknown extensions
+    @returns format: name of the rdflib parser and serializer
+    '''
+    if compression(path) is not None:
+        path = os.path.splitext(path)[0]
+    return guess_format(path) or default
+
+def serialize_graph(g, path, format = None):
+    '''
+    This function stores a graph, the serialization is compressed while it is written.
+
+    @params
+        g: RDF-graph (or Dataset)
+        path: path of the graph file, the codec and the format are chosen from its extension
+        format: RDF format (None: chosen from the extension)
+    '''
+    with open_file(path, "wb") as graph_file:
+        g.serialize(destination=graph_file, encoding="utf-8", format=format or rdf_format(path))
+
+def parse_graph(path, g = None, format = None):
+    '''
+    This function loads a graph file, a compressed file is decompressed while it is parsed.
+
+    @params
+        path: path of the graph file, the codec and the format are chosen from its extension
+        g: RDF-graph the triples are added to (None: new graph, see versioned_store.new_graph())
+        format: RDF format (None: chosen from the extension)
+    @returns g: RDF-graph
+    '''
+    if g is None:
+        g = new_graph()
+    with open_file(path, "rb") as graph_file:
+        g.parse(source=graph_file, format=format or rdf_format(path))
+    return g
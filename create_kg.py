@@ -1,10 +1,20 @@
-from rdflib import Graph, Literal, RDF, URIRef
+from rdflib import Literal, RDF, URIRef
 from rdflib.namespace import XSD, SDO, Namespace, RDFS
 import csv
 import re
 import os
+import tempfile
+from io import StringIO
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat, islice, chain
+from collections import namedtuple
 from explore_data import find_variation_words
 from tqdm import tqdm
+from profiler import profiled, record_lemma, stage, is_enabled
+from compressed_io import open_file, compression, serialize_graph, parse_graph
+from versioned_store import new_graph, new_dataset
+import time
 
 NIF = Namespace("http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#")
 HLV_Word = Namespace("https://hlv.org/word/")
@@ -17,6 +27,77 @@ RDAI = Namespace("http://rdaregistry.info/Elements/i/")
 RDAIO = Namespace("http://rdaregistry.info/Elements/i/object/")
 RDAA = Namespace("http://rdaregistry.info/Elements/a/")
 
+# number of judgments that are read and turned into triples at once, the triples are inserted before the next chunk is read
+JUDGMENT_CHUNK_SIZE = 10000
+
+# the fields of a usage that are needed for the word and sentence nodes (see index_uses())
+Use = namedtuple("Use", ["token", "start", "end", "start_sent", "end_sent", "pos", "date", "context"])
+
+# datasets that can be loaded as named graphs into one Dataset (see create_dataset())
+DATASETS = {
+    "dwug_en": {"data_path": "./dwug_en/data", "language": "en"},
+    "dwug_de": {"data_path": "./dwug_de/data", "language": "de"},
+    "dwug_sv": {"data_path": "./dwug_sv/data", "language": "sv"},
+    "dwug_la": {"data_path": "./dwug_la/data", "language": "la"},
+}
+
+# names of the annotation labels
+# escapes of the characters that may not appear unescaped in the literals of N-Triples
+NT_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"})
+
+CATEGORY_LABELS = {'0':"Undecidable", '1':"Unrelated", '2':"Distantly Related", '3':"Closely Related", '4':"Identical"}
+
+@lru_cache(maxsize=4096)
+def intern_literal(value, datatype = None, lang = None):
+    '''
+    This function returns the same literal object for recurring values (e.g. categories, lemmas, POS tags, years and indexes).
+
+    @params
+        value: lexical value
+        datatype: datatype of the literal
+        lang: language tag of the literal
+    @returns literal: the literal
+    '''
+    return Literal(value, datatype=datatype, lang=lang)
+
+@lru_cache(maxsize=4096)
+def intern_uri(value, base):
+    '''
+    This function returns the same URI object for recurring nodes (e.g. annotators and the dataset).
+
+    @params
+        value: local name
+        base: namespace of the URI
+    @returns uri: the URI
+    '''
+    return URIRef(value, base = base)
+
+class TripleBatch:
+    '''
+    This class collects the triples of the model functions and inserts them into the graph at once.
+
+    It provides the add() method of a graph, so it can be passed to the model functions in place of g. The triples are only stored in a list,
+    flush() inserts them with one addN() call instead of one store call per triple.
+    '''
+    def __init__(self, g):
+        '''
+        @param g: RDF-graph (or another sink with addN()) the triples are inserted into
+        '''
+        self.g = g
+        self.triples = []
+        self.add = self.triples.append
+
+    def flush(self):
+        '''
+        This function inserts the collected triples into the graph.
+
+        @returns num_triples: number of inserted triples (including duplicates)
+        '''
+        num_triples = len(self.triples)
+        self.g.addN((s, p, o, self.g) for s, p, o in self.triples)
+        self.triples.clear()
+        return num_triples
+
 def bind_namespaces(g):
     '''
     This function binds the namespaces to the graph.
@@ -44,7 +125,7 @@ def model_dataset(g, dataset_name):
     @returns dataset_uri: URI of the dataset node 
     '''
     # dataset node
-    dataset_uri = URIRef(dataset_name, base = HLV)
+    dataset_uri = intern_uri(dataset_name, HLV)
 
     g.add((dataset_uri, RDF.type, SDO.Dataset))
 
@@ -66,16 +147,18 @@ def model_words(g, dataset_uri, word, sentence_id, start_pos, end_pos, lemma, po
         language: language of the word
     @returns word_uri: URI of the word node 
     '''
-    word_uri = URIRef(f"{word}_{sentence_id}", base = HLV_Word)
-    g.add((word_uri, RDF.type, NIF.Word))
-    g.add((word_uri, NIF.sourceUrl, dataset_uri))
-    g.add((word_uri, RDFS.label, Literal(f"{word}_{sentence_id}", datatype=XSD.string)))
+    word_lbl = f"{word}_{sentence_id}"
+    word_uri = URIRef(word_lbl, base = HLV_Word)
+    add = g.add
+    add((word_uri, RDF.type, NIF.Word))
+    add((word_uri, NIF.sourceUrl, dataset_uri))
+    add((word_uri, RDFS.label, Literal(word_lbl, datatype=XSD.string)))
     # from uses
-    g.add((word_uri, NIF.anchorOf, Literal(word, lang=language)))
-    g.add((word_uri, NIF.lemma, Literal(lemma, datatype=XSD.string)))
-    g.add((word_uri, NIF.posTag, Literal(pos_tag, datatype=XSD.string)))
-    g.add((word_uri, NIF.beginIndex, Literal(start_pos, datatype=XSD.integer)))
-    g.add((word_uri, NIF.endIndex, Literal(end_pos, datatype=XSD.integer)))
+    add((word_uri, NIF.anchorOf, intern_literal(word, lang=language)))
+    add((word_uri, NIF.lemma, intern_literal(lemma, XSD.string)))
+    add((word_uri, NIF.posTag, intern_literal(pos_tag, XSD.string)))
+    add((word_uri, NIF.beginIndex, intern_literal(start_pos, XSD.integer)))
+    add((word_uri, NIF.endIndex, intern_literal(end_pos, XSD.integer)))
 
     return word_uri
 
@@ -95,19 +178,20 @@ def model_sentences(g, sentence_id, sentence, language, year, start_pos, end_pos
     @returns sentence_uri: URI of the sentence node 
     '''
     sentence_uri = URIRef(sentence_id, base = HLV_Sentence)
-    g.add((sentence_uri, RDF.type, NIF.Context))
-    g.add((sentence_uri, RDF.type, SDO.Observation))
-    g.add((sentence_uri, RDFS.label, Literal(sentence_id, datatype=XSD.string)))
-    g.add((sentence_uri, NIF.isString, Literal(sentence, lang=language)))
-    g.add((sentence_uri, SDO.observationDate, Literal(year, datatype=XSD.gYear)))
-    g.add((sentence_uri, NIF.beginIndex, Literal(start_pos, datatype=XSD.integer)))
-    g.add((sentence_uri, NIF.endIndex, Literal(end_pos, datatype=XSD.integer)))
+    add = g.add
+    add((sentence_uri, RDF.type, NIF.Context))
+    add((sentence_uri, RDF.type, SDO.Observation))
+    add((sentence_uri, RDFS.label, Literal(sentence_id, datatype=XSD.string)))
+    add((sentence_uri, NIF.isString, Literal(sentence, lang=language)))
+    add((sentence_uri, SDO.observationDate, intern_literal(year, XSD.gYear)))
+    add((sentence_uri, NIF.beginIndex, intern_literal(start_pos, XSD.integer)))
+    add((sentence_uri, NIF.endIndex, intern_literal(end_pos, XSD.integer)))
 
-    g.add((word_uri, NIF.referenceContext, sentence_uri))
+    add((word_uri, NIF.referenceContext, sentence_uri))
 
     return sentence_uri
 
-def model_annotation(g, idx, word1_uri, word2_uri, category, comment, language):
+def model_annotation(g, idx, word1_uri, word2_uri, category, comment, language, word1_lbl = None, word2_lbl = None):
     '''
     This function adds the annotation nodes.
 
@@ -119,23 +203,29 @@ def model_annotation(g, idx, word1_uri, word2_uri, category, comment, language):
         category: annotation label (integer)
         comment: comment of the annotation
         language: language of the annotated word
+        word1_lbl: label of the first annotated token (taken from its URI if not given)
+        word2_lbl: label of the second annotated token (taken from its URI if not given)
     @returns annotation_uri: URI of the annotation node 
     '''
-    idx2lbl = {'0':"Undecidable", '1':"Unrelated", '2':"Distantly Related", '3':"Closely Related", '4':"Identical"}
+    if word1_lbl is None:
+        word1_lbl = word1_uri[len(HLV_Word):]
+    if word2_lbl is None:
+        word2_lbl = word2_uri[len(HLV_Word):]
 
     # judgements
     annotation_uri = URIRef(idx, base = HLV_Annotation)
-    g.add((annotation_uri, RDF.type, NIF.Annotation))
+    add = g.add
+    add((annotation_uri, RDF.type, NIF.Annotation))
     # Item
-    g.add((annotation_uri, RDF.type, RDAI.P40080))
-    g.add((annotation_uri, RDFS.label, Literal(f"{g.value(word1_uri, RDFS.label)}_{g.value(word2_uri, RDFS.label)}", datatype=XSD.string)))
+    add((annotation_uri, RDF.type, RDAI.P40080))
+    add((annotation_uri, RDFS.label, Literal(f"{word1_lbl}_{word2_lbl}", datatype=XSD.string)))
 
-    g.add((word1_uri, NIF.annotation, annotation_uri))
-    g.add((word2_uri, NIF.annotation, annotation_uri))
-    g.add((annotation_uri, NIF.category, Literal(category, datatype=XSD.integer)))
-    g.add((annotation_uri, NIF.category, Literal(idx2lbl[category], datatype=XSD.string)))
+    add((word1_uri, NIF.annotation, annotation_uri))
+    add((word2_uri, NIF.annotation, annotation_uri))
+    add((annotation_uri, NIF.category, intern_literal(category, XSD.integer)))
+    add((annotation_uri, NIF.category, intern_literal(CATEGORY_LABELS[category], XSD.string)))
     # comment
-    g.add((annotation_uri, RDAI.P40064, Literal(comment, lang=language)))
+    add((annotation_uri, RDAI.P40064, intern_literal(comment, lang=language)))
 
     return annotation_uri
 
@@ -149,81 +239,485 @@ def model_annotator(g, annotator, annotation_uri):
         annotation_uri: URI of the annotation
     @returns annotator_uri: URI of the annotator node 
     '''
-    annotator_uri = URIRef(re.search("\d+", annotator).group(), base=HLV_Annotator)
+    annotator_uri = intern_uri(re.search("\d+", annotator).group(), HLV_Annotator)
     # Agent
     g.add((annotator_uri, RDF.type, RDAA.P50157))
-    g.add((annotator_uri, RDFS.label, Literal(annotator, datatype=XSD.string)))
+    g.add((annotator_uri, RDFS.label, intern_literal(annotator, XSD.string)))
 
     # has annotator
     g.add((annotation_uri, RDAIO.P40015, annotator_uri))
     return annotator_uri
 
-def read_csv(path):
+def nt_term(term):
+    '''
+    This function writes an RDF term in the N-Triples syntax.
+
+    @param term: URIRef, Literal or BNode
+    @returns text: the term as it appears in an N-Triples line
+    '''
+    if isinstance(term, Literal):
+        # Literal.n3() writes multi-line strings in triple quotes, which N-Triples does not allow
+        value = f'"{str(term).translate(NT_ESCAPES)}"'
+        if term.language:
+            return f"{value}@{term.language}"
+        if term.datatype:
+            return f"{value}^^<{term.datatype}>"
+        return value
+    return term.n3()
+
+def nt_line(triple):
+    '''
+    This function writes a triple as one line of an N-Triples file.
+
+    @param triple: (subject, predicate, object) triple
+    @returns line: N-Triples line ending with a newline
+    '''
+    s, p, o = triple
+    return f"{nt_term(s)} {nt_term(p)} {nt_term(o)} .\n"
+
+class NTriplesWriter:
+    '''
+    This class writes triples directly to an N-Triples stream instead of storing them in a graph.
+
+    It provides the add() method of a graph, so it can be passed to the model functions in place of g.
+    '''
+    def __init__(self, stream):
+        '''
+        @param stream: open text stream the N-Triples lines are written to
+        '''
+        self.stream = stream
+        self.num_triples = 0
+
+    def add(self, triple):
+        '''
+        This function writes one triple.
+
+        @param triple: (subject, predicate, object) triple
+        '''
+        self.stream.write(nt_line(triple))
+        self.num_triples += 1
+
+    def addN(self, quads):
+        '''
+        This function writes several triples (the context of the quads is ignored).
+
+        @param quads: iterable of (subject, predicate, object, context) quads
+        '''
+        for s, p, o, _ in quads:
+            self.add((s, p, o))
+
+def iter_csv(path):
     '''
-    This function reads a csv file.
+    This function reads the rows of a csv file one by one.
+
+    The file is closed when all rows have been read or the generator is closed.
 
     @param path: path of the csv file
+    @returns rows: generator of the rows (dictionaries)
+    '''
+    with open(path) as csvfile:
+        yield from csv.DictReader(csvfile, delimiter='\t', quoting=csv.QUOTE_NONE, strict=True)
+
+def iter_chunks(rows, chunk_size = JUDGMENT_CHUNK_SIZE):
+    '''
+    This function groups rows into chunks.
+
+    @params
+        rows: iterable of rows
+        chunk_size: maximal number of rows per chunk
+    @returns chunks: generator of lists of rows
+    '''
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+def index_uses(path):
+    '''
+    This function indexes the usages of a uses file by their identifier.
+
+    Only the fields of the word and sentence nodes are kept (see Use), e.g. not the tokenized and lemmatized contexts.
+
+    @param path: path of the uses file
+    @returns uses_index: dictionary mapping each identifier to its (first) usage
+    '''
+    uses_index = dict()
+    for row in iter_csv(path):
+        # keep the first occurence like the former linear search
+        if row["identifier"] not in uses_index:
+            start, end = row["indexes_target_token"].split(":")
+            start_sent, end_sent = row["indexes_target_sentence"].split(":")
+            token = row["context_tokenized"].split(" ")[int(row["indexes_target_token_tokenized"])]
+            uses_index[row["identifier"]] = Use(token, start, end, start_sent, end_sent, row["pos"], row["date"], row["context"])
+    return uses_index
+
+def model_usage(g, dataset_uri, sentence_id, use, lemma, language):
+    '''
+    This function adds the word node and the sentence node of one usage.
+
+    @params
+        g: RDF-graph
+        dataset_uri: URI of the dataset node
+        sentence_id: identifier of the usage
+        use: the usage (see index_uses())
+        lemma: lemma of the word
+        language: language of the dataset
     @returns 
-        csvfile: open csv file
-        list(reader): the csv file as a list
+        word_uri: URI of the word node
+        word_lbl: label of the word node
+    '''
+    word_uri = model_words(g=g, dataset_uri=dataset_uri, word=use.token, sentence_id=sentence_id, start_pos=use.start, end_pos=use.end, lemma=lemma, pos_tag=use.pos, language=language)
+    model_sentences(g=g, sentence_id=sentence_id, sentence=use.context, language=language, year=use.date, start_pos=use.start_sent, end_pos=use.end_sent, word_uri=word_uri)
+    return word_uri, f"{use.token}_{sentence_id}"
+
+def count_judgments(path):
+    '''
+    This function counts the judgments in a judgments file without parsing the rows.
+
+    @param path: path of the judgments file
+    @returns num_judgments: number of judgments in the file
+    '''
+    with open(path) as judgment_file:
+        judgment_file.readline() # header
+        num_judgments = sum(1 for line in judgment_file if line.strip())
+    return num_judgments
+
+def model_lemma(g, dataset_uri, data_path, lemma, language, annotation_idx, annotator_g = None):
+    '''
+    This function adds the words, sentences, annotations and annotators of one lemma.
+
+    @params
+        g: RDF-graph (or a TripleBatch that collects the triples)
+        dataset_uri: URI of the dataset node
+        data_path: path to the data folder
+        lemma: name of the lemma folder
+        language: language of the dataset
+        annotation_idx: id of the first annotation of the lemma
+        annotator_g: graph the annotator nodes are added to (None: g), the annotators are shared by the lemmas
+    @returns annotation_idx: id of the first annotation of the next lemma
+    '''
+    uses_index = index_uses(f"{data_path}/{lemma}/uses.csv")
+
+    # the triples of each chunk of judgments are inserted at once, before the next chunk is read
+    batch = g if isinstance(g, TripleBatch) else TripleBatch(g)
+
+    # word, sentence and annotator nodes are only created once per lemma
+    word_uris = dict()
+    annotator_uris = dict()
+    
+    for judgment_chunk in iter_chunks(iter_csv(f"{data_path}/{lemma}/judgments.csv")):
+        for judgment_row in judgment_chunk:
+            # first and second word
+            word_pair = []
+            for sentence_id in (judgment_row["identifier1"], judgment_row["identifier2"]):
+                if sentence_id not in word_uris:
+                    # the usage is not needed anymore once its nodes exist
+                    word_uris[sentence_id] = model_usage(g=batch, dataset_uri=dataset_uri, sentence_id=sentence_id, use=uses_index.pop(sentence_id), lemma=lemma, language=language)
+                word_pair.append(word_uris[sentence_id])
+            (word1_uri, word1_lbl), (word2_uri, word2_lbl) = word_pair
+
+            # annotation
+            annotation_uri = model_annotation(g=batch, idx=str(annotation_idx), word1_uri=word1_uri, word2_uri=word2_uri, category=judgment_row["judgment"], comment=judgment_row["comment"], language=language, word1_lbl=word1_lbl, word2_lbl=word2_lbl)
+            annotation_idx += 1
+            annotator = judgment_row["annotator"]
+            if annotator not in annotator_uris:
+                annotator_uris[annotator] = model_annotator(g=batch if annotator_g is None else annotator_g, annotator=annotator, annotation_uri=annotation_uri)
+            else:
+                # has annotator
+                batch.add((annotation_uri, RDAIO.P40015, annotator_uris[annotator]))
+
+        if batch is not g:
+            batch.flush()
+    return annotation_idx
+
+def build_lemma_shard(data_path, dataset_name, lemma, language, annotation_idx):
+    '''
+    This function builds the triples of one lemma in a separate graph (worker of the parallel build).
+
+    @params
+        data_path: path to the data folder
+        dataset_name: name of the dataset
+        lemma: name of the lemma folder
+        language: language of the dataset
+        annotation_idx: id of the first annotation of the lemma
+    @returns shard: list of the triples of the lemma
     '''
-    csvfile = open(path)
-    reader = csv.DictReader(csvfile, delimiter='\t', quoting=csv.QUOTE_NONE,strict=True)
-    return csvfile, list(reader)
+    batch = TripleBatch(None)
+    dataset_uri = intern_uri(dataset_name, HLV)
+    model_lemma(batch, dataset_uri, data_path, lemma, language, annotation_idx)
+    # without duplicates, like the triples of a graph
+    return list(dict.fromkeys(batch.triples))
 
-def create_kg(data_path = "./dwug_en/data", dataset_name = "dwug_en", annotated_words = find_variation_words(), language="en"):    
+def stream_lemma_shard(data_path, dataset_name, lemma, language, annotation_idx):
+    '''
+    This function writes the triples of one lemma to an N-Triples string (worker of the parallel streaming build).
+
+    @params
+        data_path: path to the data folder
+        dataset_name: name of the dataset
+        lemma: name of the lemma folder
+        language: language of the dataset
+        annotation_idx: id of the first annotation of the lemma
+    @returns
+        shard: the triples of the lemma in the N-Triples format
+        annotator_shard: the triples of the annotator nodes of the lemma (see write_annotators())
+    '''
+    shard = NTriplesWriter(StringIO())
+    annotator_shard = NTriplesWriter(StringIO())
+    dataset_uri = intern_uri(dataset_name, HLV)
+    model_lemma(shard, dataset_uri, data_path, lemma, language, annotation_idx, annotator_g=annotator_shard)
+    return shard.stream.getvalue(), annotator_shard.stream.getvalue()
+
+def write_annotators(nt_file, annotator_shard, written_lines):
+    '''
+    This function writes the annotator triples of a lemma that no previous lemma has written.
+
+    Every lemma creates the nodes of its annotators, in a graph the duplicates of the other lemmas collapse.
+
+    @params
+        nt_file: open N-Triples file
+        annotator_shard: the annotator triples of the lemma in the N-Triples format
+        written_lines: set of the annotator lines that have been written (updated)
+    '''
+    for line in annotator_shard.splitlines(keepends=True):
+        if line not in written_lines:
+            written_lines.add(line)
+            nt_file.write(line)
+
+def lemma_offsets(data_path, lemmas, first_annotation = 1):
+    '''
+    This function assigns the id of the first annotation to each lemma.
+
+    The ids are a running counter over the sorted lemmas, so they do not depend on the build order.
+
+    @params
+        data_path: path to the data folder
+        lemmas: sorted list of the lemma folders
+        first_annotation: id of the first annotation of the first lemma
+    @returns offsets: list with the id of the first annotation per lemma
+    '''
+    offsets = []
+    annotation_idx = first_annotation
+    for lemma in lemmas:
+        offsets.append(annotation_idx)
+        annotation_idx += count_judgments(f"{data_path}/{lemma}/judgments.csv")
+    return offsets
+
+@profiled("create_kg")
+def create_kg(data_path = "./dwug_en/data", dataset_name = "dwug_en", annotated_words = None, language="en", num_workers = 1, store_path = None, serialize = True, first_annotation = 1, graph_path = None):    
     '''
     This file creates the knowledge graph.
 
     @params
         data_path: path to the data folder
         dataset_name: name of the dataset
-        annotated_words: list of words that should be included
+        annotated_words: list of words that should be included (default: words annotated by all annotators)
         language: language of the dataset
+        num_workers: number of processes building the lemmas in parallel (None: number of cores)
+        store_path: path of an SQLite database the graph is stored in (None: the graph is kept in memory)
+        serialize: whether the graph is stored in the turtle format
+        first_annotation: id of the first annotation (annotations of different datasets in one Dataset need different ids)
+        graph_path: path of the serialized graph, .gz or .zst compresses it (default: ./graphs/{dataset_name}.ttl)
     @returns g: RDF-graph
     '''
-    g = Graph(bind_namespaces="rdflib")
+    if annotated_words is None:
+        annotated_words = find_variation_words()
+    if store_path is None:
+        g = new_graph()
+    else:
+        from sqlite_store import open_graph
+        g = open_graph(store_path, clear=True)
     bind_namespaces(g)
     dataset_uri = model_dataset(g, dataset_name)
-    annotation_idx = 1
 
     # Iterate through single csv files for the specified words
-    for annotated_word in tqdm(set(annotated_words).intersection(set(os.listdir(data_path))), desc="Processing data"):
-        judgment_file, judgment_dict = read_csv(f"{data_path}/{annotated_word}/judgments.csv")
-        uses_file, uses_dict = read_csv(f"{data_path}/{annotated_word}/uses.csv")
+    lemmas = sorted(set(annotated_words).intersection(set(os.listdir(data_path))))
+    offsets = lemma_offsets(data_path, lemmas, first_annotation)
+
+    if num_workers == 1:
+        # len() counts the triples of a database after each commit, so the triples are only counted for the profiler
+        profiling = is_enabled()
+        for lemma, annotation_idx in tqdm(zip(lemmas, offsets), total=len(lemmas), desc="Processing data"):
+            start, num_triples = time.perf_counter(), len(g) if profiling else 0
+            model_lemma(g, dataset_uri, data_path, lemma, language, annotation_idx)
+            g.commit()
+            if profiling:
+                record_lemma(lemma, time.perf_counter() - start, len(g) - num_triples)
+    else:
+        # each worker builds one lemma, the shards are merged in the lemma order
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            shards = executor.map(build_lemma_shard, repeat(data_path), repeat(dataset_name), lemmas, repeat(language), offsets)
+            start = time.perf_counter()
+            for lemma, shard in tqdm(zip(lemmas, shards), total=len(lemmas), desc="Processing data"):
+                g.addN((s, p, o, g) for s, p, o in shard)
+                g.commit()
+                # time until the shard of the lemma has been built and merged
+                record_lemma(lemma, time.perf_counter() - start, len(shard))
+                start = time.perf_counter()
         
-        for judgment_row in judgment_dict:
-            # first word
-            sentence1_id = judgment_row["identifier1"]
-            uses1_rows = [row for row in uses_dict if row["identifier"] == sentence1_id]
-            uses1_row = uses1_rows[0]
-            token1 = uses1_row["context_tokenized"].split(" ")[int(uses1_row["indexes_target_token_tokenized"])]
-            start1, end1 = uses1_row["indexes_target_token"].split(":")
-            start1_sent, end1_sent = uses1_row["indexes_target_sentence"].split(":")
-            word1_uri = model_words(g=g, dataset_uri=dataset_uri, word=token1, sentence_id=sentence1_id, start_pos=start1, end_pos=end1, lemma=annotated_word, pos_tag=uses1_row["pos"], language=language)
-            model_sentences(g=g, sentence_id=sentence1_id, sentence=uses1_row["context"], language=language, year=uses1_row["date"], start_pos=start1_sent, end_pos=end1_sent, word_uri=word1_uri)
-            
-            # second word
-            sentence2_id = judgment_row["identifier2"]
-
-            uses2_rows = [row for row in uses_dict if row["identifier"] == sentence2_id]
-            uses2_row = uses2_rows[0]
-            token2 = uses2_row["context_tokenized"].split(" ")[int(uses2_row["indexes_target_token_tokenized"])]
-            start2, end2 = uses2_row["indexes_target_token"].split(":")
-            start2_sent, end2_sent = uses2_row["indexes_target_sentence"].split(":")
-            word2_uri = model_words(g=g, dataset_uri=dataset_uri, word=token2, sentence_id=sentence2_id, start_pos=start2, end_pos=end2, lemma=annotated_word, pos_tag=uses2_row["pos"], language=language)
-            model_sentences(g=g, sentence_id=sentence2_id, sentence=uses2_row["context"], language=language, year=uses2_row["date"], start_pos=start2_sent, end_pos=end2_sent, word_uri=word2_uri)
+    # Store the entire Graph in the RDF Turtle format
+    if serialize:
+        with stage("serialize"):
+            serialize_graph(g, graph_path or f"./graphs/{dataset_name}.ttl")
+    return g
 
-            # annotation
-            annotation_uri = model_annotation(g=g, idx=str(annotation_idx), word1_uri=word1_uri, word2_uri=word2_uri, category=judgment_row["judgment"], comment=judgment_row["comment"], language=language)
-            annotation_idx += 1
-            model_annotator(g=g, annotator=judgment_row["annotator"], annotation_uri=annotation_uri)
+def build_dataset_graph(data_path, dataset_name, annotated_words, language, first_annotation, path):
+    '''
+    This function builds the triples of one dataset and stores them in a file (worker of create_dataset()).
 
-        judgment_file.close()
-        uses_file.close()
-        
-    # Store the entire Graph in the RDF Turtle format
-    g.serialize(destination = f"./graphs/{dataset_name}.ttl", encoding="utf-8", format="turtle")
+    The lemmas are built one after another and their triples are written to the file, the worker does not keep a graph of the dataset
+    and does not send the triples back to the parent process.
+
+    @params
+        data_path: path to the data folder
+        dataset_name: name of the dataset
+        annotated_words: list of words that should be included
+        language: language of the dataset
+        first_annotation: id of the first annotation
+        path: path of the file (see kg_cache.save_triples())
+    @returns path: path of the file
+    '''
+    from kg_cache import save_triples
+
+    lemmas = sorted(set(annotated_words).intersection(set(os.listdir(data_path))))
+    offsets = lemma_offsets(data_path, lemmas, first_annotation)
+    dataset_triple = TripleBatch(None)
+    model_dataset(dataset_triple, dataset_name)
+    # the annotators of several lemmas are stored several times, they collapse when the file is loaded
+    save_triples(chain(dataset_triple.triples, *(build_lemma_shard(data_path, dataset_name, lemma, language, offset) for lemma, offset in zip(lemmas, offsets))), path)
+    return path
+
+@profiled("create_dataset")
+def create_dataset(dataset_names = ("dwug_en",), annotated_words = None, datasets = DATASETS, num_workers = None, serialize = False, graph_path = None):
+    '''
+    This function loads several datasets (e.g. DWUG EN, DE, SV and LA) as named graphs into one Dataset.
+
+    Each dataset is built by its own worker process. The name of each graph is the URI of its dataset node (e.g. http://hlv.org/dwug_de),
+    so the queries can be restricted to some of the datasets (see query_kg.select_datasets()). The annotation ids are a running counter over all datasets.
+
+    @params
+        dataset_names: names of the datasets in datasets
+        annotated_words: dictionary of the words that should be included per dataset (default: words annotated by all annotators for dwug_en, all words for the other datasets)
+        datasets: dictionary of the data path and language of each dataset
+        num_workers: number of processes (None: number of cores)
+        serialize: whether the Dataset is stored in the TriG format
+        graph_path: path of the serialized Dataset, .gz or .zst compresses it (default: ./graphs/{names of the datasets}.trig)
+    @returns ds: Dataset with one named graph per dataset
+    '''
+    annotated_words = dict(annotated_words or dict())
+    builds = []
+    first_annotation = 1
+    for dataset_name in dataset_names:
+        data_path, language = datasets[dataset_name]["data_path"], datasets[dataset_name]["language"]
+        words = annotated_words.get(dataset_name)
+        if words is None:
+            words = find_variation_words() if dataset_name == "dwug_en" else os.listdir(data_path)
+        lemmas = sorted(set(words).intersection(set(os.listdir(data_path))))
+        builds.append((data_path, dataset_name, lemmas, language, first_annotation))
+        first_annotation += sum(count_judgments(f"{data_path}/{lemma}/judgments.csv") for lemma in lemmas)
+
+    from kg_cache import load_triples
+
+    ds = new_dataset()
+    bind_namespaces(ds)
+    # each worker stores the triples of its dataset in a file, the files are loaded into the named graphs while the other workers are still building
+    with tempfile.TemporaryDirectory() as tmp_dir, ProcessPoolExecutor(max_workers=num_workers) as executor:
+        paths = executor.map(build_dataset_graph, *zip(*builds), [f"{tmp_dir}/{dataset_name}.pickle" for dataset_name in dataset_names])
+        for dataset_name, path in zip(dataset_names, paths):
+            context = ds.graph(intern_uri(dataset_name, HLV))
+            ds.addN((s, p, o, context) for s, p, o in load_triples(path)[1])
+            os.remove(path)
+
+    if serialize:
+        serialize_graph(ds, graph_path or f"./graphs/{'_'.join(dataset_names)}.trig")
+    return ds
+
+@profiled("load_dataset")
+def load_dataset(dataset_names = ("dwug_en",), graph_path = None, num_workers = None):
+    '''
+    This function loads the Dataset stored by create_dataset() and only builds it if the TriG file does not exist.
+
+    The TriG file is not checked against the csv files, build it again with create_dataset(serialize=True) if the data changes.
+
+    @params
+        dataset_names: names of the datasets in DATASETS
+        graph_path: path of the TriG file (default: ./graphs/{names of the datasets}.trig, also compressed with .gz or .zst)
+        num_workers: number of processes if the Dataset is built (None: number of cores)
+    @returns ds: Dataset with one named graph per dataset
+    '''
+    base_path = f"./graphs/{'_'.join(dataset_names)}.trig"
+    paths = [graph_path] if graph_path is not None else [base_path + suffix for suffix in ("", ".gz", ".zst")]
+    for path in paths:
+        if os.path.isfile(path):
+            print(f"loading {path}...")
+            ds = new_dataset()
+            bind_namespaces(ds)
+            return parse_graph(path, ds)
+    return create_dataset(dataset_names, num_workers=num_workers, serialize=True, graph_path=graph_path)
+
+def stream_kg(data_path = "./dwug_en/data", dataset_name = "dwug_en", annotated_words = None, language="en", num_workers = 1, to_turtle = False, nt_path = None):
+    '''
+    This function writes the knowledge graph directly to an N-Triples file while the csv files are read.
+
+    The triples are not collected in a graph, so the memory usage does not grow with the size of the dataset.
+
+    @params
+        data_path: path to the data folder
+        dataset_name: name of the dataset
+        annotated_words: list of words that should be included (default: words annotated by all annotators)
+        language: language of the dataset
+        num_workers: number of processes building the lemmas in parallel (None: number of cores)
+        to_turtle: additionally convert the N-Triples file into the turtle format
+        nt_path: path of the N-Triples file, .gz or .zst compresses it while it is written (default: ./graphs/{dataset_name}.nt)
+    @returns nt_path: path of the N-Triples file
+    '''
+    if annotated_words is None:
+        annotated_words = find_variation_words()
+    if nt_path is None:
+        nt_path = f"./graphs/{dataset_name}.nt"
+    lemmas = sorted(set(annotated_words).intersection(set(os.listdir(data_path))))
+    offsets = lemma_offsets(data_path, lemmas)
+
+    # the annotator nodes are written once, so the file has the same triples as the graph
+    written_lines = set()
+    with open_file(nt_path, "wt", encoding="utf-8", newline="\n") as nt_file:
+        writer = NTriplesWriter(nt_file)
+        dataset_uri = model_dataset(writer, dataset_name)
+
+        if num_workers == 1:
+            for lemma, annotation_idx in tqdm(zip(lemmas, offsets), total=len(lemmas), desc="Processing data"):
+                annotator_shard = NTriplesWriter(StringIO())
+                model_lemma(writer, dataset_uri, data_path, lemma, language, annotation_idx, annotator_g=annotator_shard)
+                write_annotators(nt_file, annotator_shard.stream.getvalue(), written_lines)
+        else:
+            # each worker writes one lemma, the shards are appended in the lemma order
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                shards = executor.map(stream_lemma_shard, repeat(data_path), repeat(dataset_name), lemmas, repeat(language), offsets)
+                for shard, annotator_shard in tqdm(shards, total=len(lemmas), desc="Processing data"):
+                    nt_file.write(shard)
+                    write_annotators(nt_file, annotator_shard, written_lines)
+
+    if to_turtle:
+        ntriples_to_turtle(nt_path)
+    return nt_path
+
+def ntriples_to_turtle(nt_path, ttl_path = None):
+    '''
+    This function converts an N-Triples file into the turtle format.
+
+    Note that the conversion loads the full graph into memory.
+
+    @params
+        nt_path: path of the N-Triples file
+        ttl_path: path of the turtle file (default: nt_path with the suffix .ttl, compressed like nt_path)
+    @returns g: RDF-graph
+    '''
+    if ttl_path is None:
+        suffix = os.path.splitext(nt_path)[1] if compression(nt_path) else ""
+        ttl_path = f"{os.path.splitext(nt_path[:len(nt_path) - len(suffix)])[0]}.ttl{suffix}"
+    g = new_graph()
+    bind_namespaces(g)
+    parse_graph(nt_path, g, format="nt")
+    serialize_graph(g, ttl_path, format="turtle")
     return g
 
 if __name__ == "__main__":
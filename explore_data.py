@@ -1,6 +1,50 @@
-import js2py
 import os 
 import csv
+import json
+
+def iter_js_records(path, chunk_size = 1 << 16):
+    '''
+    This function reads the records of a DWUG JavaScript file of the form `name = [{...}, {...}, ...]` one by one.
+
+    The objects are decoded as JSON literals while the file is read in chunks, so the file is never evaluated or loaded completely.
+
+    @params
+        path: path of the JavaScript file
+        chunk_size: number of characters read at once
+    @returns records: generator of the records as dictionaries
+    '''
+    decoder = json.JSONDecoder()
+    with open(path, encoding = "utf-8") as f:
+        buffer = ""
+        eof = False
+        # skip the variable assignment up to the opening bracket of the array
+        while "[" not in buffer:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError(f"{path} does not contain an array literal")
+            buffer += chunk
+        pos = buffer.index("[") + 1
+
+        while True:
+            # skip whitespace and separators between the records
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos == len(buffer):
+                    raise json.JSONDecodeError("incomplete record", buffer, pos)
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as error:
+                if eof:
+                    raise ValueError(f"{path} could not be parsed: {error}")
+                # the record is incomplete, read the next chunk
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield record
 
 def find_variation_words():
     '''
@@ -9,8 +53,7 @@ def find_variation_words():
     @returns full: list with words that have been annotated by every annotator
     '''
     # open stats
-    with open("./dwug_en/plots/opt/judgments/stats.js", encoding = "utf-8") as f:
-        stats = js2py.eval_js(f.read())
+    stats = iter_js_records("./dwug_en/plots/opt/judgments/stats.js")
 
     # find words that are annotated by every annotator
     full = []
@@ -56,13 +99,13 @@ def num_annotations(include = []):
     @returns num_annotations: number of annotations (only the included words)
     '''
     num_annotations = 0
-    with open("./dwug_en/plots/opt/judgments/data_joint.js", encoding = "utf-8") as f:
-        annotations = js2py.eval_js(f.read())
+    annotations = iter_js_records("./dwug_en/plots/opt/judgments/data_joint.js")
 
     if include == []:
-        num_annotations = len(annotations)
+        num_annotations = sum(1 for annotation in annotations)
         print(f"\nTotal number of annotations: {num_annotations}\n")
     else:        
+        include = set(include)
         for annotation in annotations:
             if annotation["lemma"] in include:
                 num_annotations += 1
@@ -0,0 +1,596 @@
+from rdflib import Literal, URIRef, BNode
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from tqdm import tqdm
+from profiler import profiled, record_lemma, stage
+from compressed_io import serialize_graph, parse_graph
+from versioned_store import new_graph, graph_version
+import time
+import hashlib
+import pickle
+import json
+import weakref
+import glob
+import gc
+import os
+
+# increase when the format of the cache or the modelling in create_kg changes
+CACHE_VERSION = 3
+
+# fraction of the lemmas that may have changed since the snapshot of the graph was stored before it is stored again (see update_kg())
+SNAPSHOT_LAG = 0.25
+
+def hash_lemma(data_path, lemma):
+    '''
+    This function computes the content hash of the csv files of one lemma.
+
+    @params
+        data_path: path to the data folder
+        lemma: name of the lemma folder
+    @returns lemma_hash: hex digest of the judgments and uses file
+    '''
+    lemma_hash = hashlib.sha256()
+    for file_name in ["judgments.csv", "uses.csv"]:
+        with open(f"{data_path}/{lemma}/{file_name}", "rb") as csv_file:
+            lemma_hash.update(csv_file.read())
+    return lemma_hash.hexdigest()
+
+def lemma_stat(data_path, lemma):
+    '''
+    This function returns the size and modification time of the csv files of one lemma.
+
+    @params
+        data_path: path to the data folder
+        lemma: name of the lemma folder
+    @returns stat: list of the size and modification time (in ns) of the judgments and uses file
+    '''
+    stat = []
+    for file_name in ["judgments.csv", "uses.csv"]:
+        file_stat = os.stat(f"{data_path}/{lemma}/{file_name}")
+        stat += [file_stat.st_size, file_stat.st_mtime_ns]
+    return stat
+
+def hash_lemmas(data_path, lemmas, manifest):
+    '''
+    This function computes the content hashes of the lemmas, the csv files of a lemma are only read if their size or modification time differs from the manifest.
+
+    @params
+        data_path: path to the data folder
+        lemmas: list of the lemma folders
+        manifest: dictionary with the state of the cached graph (see read_manifest())
+    @returns
+        lemma_hashes: dictionary of the hash of each lemma (see hash_lemma())
+        lemma_stats: dictionary of the size and modification time of the files of each lemma (see lemma_stat())
+    '''
+    lemma_hashes, lemma_stats = dict(), dict()
+    for lemma in lemmas:
+        lemma_stats[lemma] = lemma_stat(data_path, lemma)
+        lemma_info = manifest["lemmas"].get(lemma)
+        if lemma_info is not None and lemma_info["stat"] == lemma_stats[lemma]:
+            lemma_hashes[lemma] = lemma_info["hash"]
+        else:
+            lemma_hashes[lemma] = hash_lemma(data_path, lemma)
+    return lemma_hashes, lemma_stats
+
+def shard_id(dataset_name, language, lemma_hash, first_annotation):
+    '''
+    This function computes the version of the triple file of a lemma from the inputs of its triples.
+
+    @params
+        dataset_name: name of the dataset
+        language: language of the dataset
+        lemma_hash: content hash of the csv files of the lemma (see hash_lemma())
+        first_annotation: id of the first annotation of the lemma
+    @returns shard: hex digest of the inputs
+    '''
+    return hashlib.sha256(f"{CACHE_VERSION}|{dataset_name}|{language}|{first_annotation}|{lemma_hash}".encode("utf-8")).hexdigest()[:16]
+
+def shard_path(cache_dir, dataset_name, lemma, shard):
+    '''
+    This function returns the path of the triple file of one version of a lemma.
+
+    @params
+        cache_dir: folder of the cache files
+        dataset_name: name of the dataset
+        lemma: name of the lemma folder
+        shard: version of the triple file (see shard_id())
+    @returns path: path of the triple file
+    '''
+    return f"{cache_dir}/{dataset_name}_lemmas/{lemma}_{shard}.pickle"
+
+def hash_inputs(data_path, dataset_name, annotated_words, language, lemma_hashes = None):
+    '''
+    This function computes the cache key of a knowledge graph from its input csv files and build parameters.
+
+    @params
+        data_path: path to the data folder
+        dataset_name: name of the dataset
+        annotated_words: list of words that should be included
+        language: language of the dataset
+        lemma_hashes: dictionary of the hashes of the lemmas if they have already been computed (see hash_lemma())
+    @returns key: hex digest of the inputs
+    '''
+    key = hashlib.sha256(f"{CACHE_VERSION}|{dataset_name}|{language}".encode("utf-8"))
+    for lemma in sorted(set(annotated_words).intersection(set(os.listdir(data_path)))):
+        lemma_hash = lemma_hashes[lemma] if lemma_hashes is not None else hash_lemma(data_path, lemma)
+        key.update(f"|{lemma}|{lemma_hash}".encode("utf-8"))
+    return key.hexdigest()
+
+def encode_term(term):
+    '''
+    This function turns an RDF term into a tuple of strings.
+
+    @param term: URIRef, Literal or BNode
+    @returns encoded_term: tuple of the kind of the term and its values
+    '''
+    if isinstance(term, Literal):
+        return ("l", str(term), str(term.datatype) if term.datatype else None, term.language)
+    elif isinstance(term, BNode):
+        return ("b", str(term))
+    return ("u", str(term))
+
+def decode_term(encoded_term):
+    '''
+    This function turns a tuple created by encode_term() back into an RDF term.
+
+    @param encoded_term: tuple of the kind of the term and its values
+    @returns term: URIRef, Literal or BNode
+    '''
+    if encoded_term[0] == "l":
+        return Literal(encoded_term[1], datatype=encoded_term[2], lang=encoded_term[3])
+    elif encoded_term[0] == "b":
+        return BNode(encoded_term[1])
+    return URIRef(encoded_term[1])
+
+def save_triples(triples, path, namespaces = ()):
+    '''
+    This function stores triples in a compact binary file.
+
+    Each term is stored once, the triples are stored as an array of term ids.
+
+    @params
+        triples: iterable of (subject, predicate, object) triples
+        path: path of the cache file
+        namespaces: list of (prefix, namespace) pairs that should be bound when loading
+    '''
+    term2id = dict()
+    terms = []
+    triple_ids = array("I")
+    for triple in triples:
+        for term in triple:
+            term_id = term2id.get(term)
+            if term_id is None:
+                term_id = term2id[term] = len(terms)
+                terms.append(encode_term(term))
+            triple_ids.append(term_id)
+
+    with open(path, "wb") as cache_file:
+        pickle.dump((list(namespaces), terms, triple_ids.tobytes()), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_triples(path):
+    '''
+    This function loads triples stored with save_triples().
+
+    @param path: path of the cache file
+    @returns 
+        namespaces: list of (prefix, namespace) pairs
+        triples: generator of (subject, predicate, object) triples
+    '''
+    with open(path, "rb") as cache_file:
+        namespaces, terms, triple_bytes = pickle.load(cache_file)
+
+    terms = [decode_term(term) for term in terms]
+    triple_ids = array("I")
+    triple_ids.frombytes(triple_bytes)
+    term_ids = iter(triple_ids)
+    return namespaces, ((terms[s], terms[p], terms[o]) for s, p, o in zip(term_ids, term_ids, term_ids))
+
+# cache files of the graphs loaded in this session: id(graph) -> (weak reference to the graph, version of the graph, cache path, versions of the lemma triple files in the graph)
+_graph_paths = dict()
+
+def register_graph(g, cache_path, shards = None):
+    '''
+    This function remembers the cache file a graph has been loaded from or stored in.
+
+    Data derived from the graph (e.g. the pair variation view) can be stored next to this file as long as the graph does not change.
+
+    @params
+        g: RDF-graph
+        cache_path: path of the cache file (prefix of the cache files of a graph assembled from its lemmas)
+        shards: dictionary of the version of the triple file of each lemma in the graph (see shard_id(), None: the graph cannot be updated in place)
+    '''
+    _graph_paths[id(g)] = (weakref.ref(g), graph_version(g), cache_path, shards)
+
+def registered_graph(g):
+    '''
+    This function returns the registration of a graph if the graph has not changed since (see register_graph()).
+
+    @param g: RDF-graph
+    @returns registered: tuple of the weak reference, the version, the cache path and the lemma versions of the graph (None if the graph was not loaded with load_kg() or has changed since)
+    '''
+    registered = _graph_paths.get(id(g))
+    if registered is None or registered[0]() is not g or registered[1] is None or registered[1] != graph_version(g):
+        return None
+    return registered
+
+def graph_cache_path(g):
+    '''
+    This function returns the cache file of a graph.
+
+    @param g: RDF-graph
+    @returns cache_path: path of the cache file (None if the graph was not loaded with load_kg() or has changed since)
+    '''
+    registered = registered_graph(g)
+    return registered[2] if registered is not None else None
+
+def remove_stale_caches(cache_dir, dataset_name):
+    '''
+    This function removes the cache files of older versions of a dataset, including the data derived from them.
+
+    @params
+        cache_dir: folder of the cache files
+        dataset_name: name of the dataset
+    '''
+    for stale_path in glob.glob(f"{cache_dir}/{dataset_name}_{'?' * 16}.pickle") + glob.glob(f"{cache_dir}/{dataset_name}_{'?' * 16}_*.npz"):
+        os.remove(stale_path)
+
+def read_manifest(manifest_path, dataset_name, language):
+    '''
+    This function reads the manifest of the incremental build.
+
+    @params
+        manifest_path: path of the manifest
+        dataset_name: name of the dataset
+        language: language of the dataset
+    @returns manifest: dictionary with the state of the cached graph (empty manifest if it does not match the build parameters)
+    '''
+    empty_manifest = {"version": CACHE_VERSION, "dataset_name": dataset_name, "language": language, "key": None, "next_annotation": 1, "lemmas": dict(), "snapshot": None, "stores": dict()}
+    if not os.path.isfile(manifest_path):
+        return empty_manifest
+
+    with open(manifest_path, "r", encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if manifest.get("version") != CACHE_VERSION or manifest["dataset_name"] != dataset_name or manifest["language"] != language:
+        return empty_manifest
+    return manifest
+
+def write_manifest(cache_dir, dataset_name, manifest):
+    '''
+    This function stores the manifest and removes the triple files of lemma versions that neither the manifest, the snapshot of the graph nor a database refers to.
+
+    @params
+        cache_dir: folder of the cache files
+        dataset_name: name of the dataset
+        manifest: dictionary with the state of the cached graph (see read_manifest())
+    '''
+    manifest["stores"] = {store_path: shards for store_path, shards in manifest["stores"].items() if os.path.isfile(store_path)}
+    manifest_path = f"{cache_dir}/{dataset_name}_manifest.json"
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    used_paths = {shard_path(cache_dir, dataset_name, lemma, lemma_info["shard"]) for lemma, lemma_info in manifest["lemmas"].items()}
+    used_paths.update(shard_path(cache_dir, dataset_name, lemma, shard) for lemma, shard in (manifest["snapshot"] or dict()).items())
+    for shards in manifest["stores"].values():
+        used_paths.update(shard_path(cache_dir, dataset_name, lemma, shard) for lemma, shard in shards.items())
+    for path in glob.glob(f"{cache_dir}/{dataset_name}_lemmas/*.pickle"):
+        if path not in used_paths:
+            os.remove(path)
+
+def save_snapshot(g, snapshot_path):
+    '''
+    This function stores the whole in-memory graph, including the indexes of its store, in one file.
+
+    @params
+        g: RDF-graph
+        snapshot_path: path of the snapshot file
+    '''
+    with open(snapshot_path + ".tmp", "wb") as snapshot_file:
+        pickle.dump(g, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(snapshot_path + ".tmp", snapshot_path)
+
+def load_snapshot(snapshot_path):
+    '''
+    This function loads a graph stored with save_snapshot().
+
+    The indexes of the store are restored as they are, the triples are not inserted again.
+
+    @param snapshot_path: path of the snapshot file
+    @returns g: RDF-graph
+    '''
+    # the snapshot consists of millions of small objects, the garbage collector would scan them again and again while they are created
+    gc.disable()
+    try:
+        with open(snapshot_path, "rb") as snapshot_file:
+            return pickle.load(snapshot_file)
+    finally:
+        gc.enable()
+
+def apply_shards(g, cache_dir, dataset_name, old_shards, new_shards):
+    '''
+    This function brings a graph from one version of its lemmas to another.
+
+    The triples of the old version of each changed lemma that are not in the new version are retracted and the new triples are added,
+    so the cost depends on the changed lemmas and not on the size of the graph.
+    The triples of a subject that a triple of another lemma refers to (e.g. the annotator nodes) are shared and stay in the graph.
+
+    @params
+        g: RDF-graph that contains the triples of old_shards
+        cache_dir: folder of the cache files
+        dataset_name: name of the dataset
+        old_shards: dictionary of the version of the triple file of each lemma in the graph (see shard_id())
+        new_shards: dictionary of the version of the triple file of each lemma after the update
+    @returns changed_lemmas: list of the lemmas that have been added, changed or removed
+    '''
+    changed_lemmas = sorted(lemma for lemma in set(old_shards) | set(new_shards) if old_shards.get(lemma) != new_shards.get(lemma))
+    for lemma in tqdm(changed_lemmas, desc="Updating graph"):
+        if lemma not in old_shards:
+            g.addN((s, p, o, g) for s, p, o in load_triples(shard_path(cache_dir, dataset_name, lemma, new_shards[lemma]))[1])
+            continue
+        old_triples = set(load_triples(shard_path(cache_dir, dataset_name, lemma, old_shards[lemma]))[1])
+        new_triples = set(load_triples(shard_path(cache_dir, dataset_name, lemma, new_shards[lemma]))[1]) if lemma in new_shards else set()
+        g.addN((s, p, o, g) for s, p, o in new_triples - old_triples)
+
+        retracted_triples = old_triples - new_triples
+        for triple in retracted_triples:
+            g.remove(triple)
+        shared_subjects = {s for s in {triple[0] for triple in retracted_triples} if any(triple not in new_triples for triple in g.triples((None, None, s)))}
+        g.addN((s, p, o, g) for s, p, o in retracted_triples if s in shared_subjects)
+    return changed_lemmas
+
+def update_shards(data_path, dataset_name, annotated_words, language, num_workers, cache_dir, manifest):
+    '''
+    This function builds the lemmas whose csv files have changed and stores their triples in a new file per lemma.
+
+    The csv files of a lemma are only hashed again if their size or modification time differs from the manifest (see hash_lemmas()).
+
+    @params
+        data_path: path to the data folder
+        dataset_name: name of the dataset
+        annotated_words: list of words that should be included
+        language: language of the dataset
+        num_workers: number of processes building the changed lemmas in parallel (None: number of cores)
+        cache_dir: folder of the cache files
+        manifest: dictionary with the state of the cached graph (updated, see read_manifest())
+    @returns key: cache key of the inputs (see hash_inputs())
+    '''
+    from create_kg import build_lemma_shard, count_judgments
+
+    os.makedirs(f"{cache_dir}/{dataset_name}_lemmas", exist_ok=True)
+
+    # find the changed, new and removed lemmas (and lemmas whose file is missing)
+    lemmas = sorted(set(annotated_words).intersection(set(os.listdir(data_path))))
+    lemma_hashes, lemma_stats = hash_lemmas(data_path, lemmas, manifest)
+    changed_lemmas = []
+    for lemma in lemmas:
+        lemma_info = manifest["lemmas"].get(lemma)
+        if lemma_info is None or lemma_info["hash"] != lemma_hashes[lemma] or not os.path.isfile(shard_path(cache_dir, dataset_name, lemma, lemma_info["shard"])):
+            changed_lemmas.append(lemma)
+        else:
+            lemma_info["stat"] = lemma_stats[lemma]
+    for lemma in set(manifest["lemmas"]) - set(lemmas):
+        del manifest["lemmas"][lemma]
+
+    # annotation ids of unchanged lemmas stay the same, a changed lemma keeps its ids if they are enough
+    offsets = []
+    for lemma in changed_lemmas:
+        num_annotations = count_judgments(f"{data_path}/{lemma}/judgments.csv")
+        lemma_info = manifest["lemmas"].get(lemma)
+        if lemma_info is not None and num_annotations <= lemma_info["num_annotations"]:
+            offsets.append(lemma_info["first_annotation"])
+        else:
+            offsets.append(manifest["next_annotation"])
+            manifest["next_annotation"] += num_annotations
+        manifest["lemmas"][lemma] = {"hash": lemma_hashes[lemma], "stat": lemma_stats[lemma], "first_annotation": offsets[-1], "num_annotations": num_annotations,
+                                     "shard": shard_id(dataset_name, language, lemma_hashes[lemma], offsets[-1])}
+
+    def store_shards(shards):
+        start = time.perf_counter()
+        for lemma, shard in tqdm(zip(changed_lemmas, shards), total=len(changed_lemmas), desc="Building lemmas"):
+            save_triples(shard, shard_path(cache_dir, dataset_name, lemma, manifest["lemmas"][lemma]["shard"]))
+            # time until the lemma has been built and stored
+            record_lemma(lemma, time.perf_counter() - start, len(shard))
+            start = time.perf_counter()
+
+    if num_workers == 1:
+        store_shards(map(build_lemma_shard, repeat(data_path), repeat(dataset_name), changed_lemmas, repeat(language), offsets))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            store_shards(executor.map(build_lemma_shard, repeat(data_path), repeat(dataset_name), changed_lemmas, repeat(language), offsets))
+
+    key = hash_inputs(data_path, dataset_name, annotated_words, language, lemma_hashes)
+    if manifest["key"] != key:
+        remove_stale_caches(cache_dir, dataset_name)
+        manifest["key"] = key
+    return key
+
+@profiled("update_kg")
+def update_kg(data_path = "./dwug_en/data", dataset_name = "dwug_en", annotated_words = None, language = "en", num_workers = 1, cache_dir = "./resources/cache", serialize = False, graph_path = None, g = None):
+    '''
+    This function brings the cached knowledge graph up to date with the input csv files.
+
+    The cache stores the triples of every version of a lemma in a separate file and the manifest stores the content hash, the size and modification time of the csv files,
+    the annotation ids and the version of the triple file of every lemma. Only the lemmas whose csv files have changed are built again (see update_shards()).
+    The graph is updated in place: the triples of the old version of each changed lemma are retracted and the triples of the new version are added (see apply_shards()).
+    Without a loaded graph, the snapshot of the graph in the cache is loaded and updated (without a snapshot, the graph is assembled from all lemmas).
+    The snapshot is only stored again if more than SNAPSHOT_LAG of the lemmas have changed since it was stored, until then the manifest keeps the triple files of its lemma versions.
+
+    @params
+        data_path: path to the data folder
+        dataset_name: name of the dataset
+        annotated_words: list of words that should be included (default: words annotated by all annotators)
+        language: language of the dataset
+        num_workers: number of processes building the changed lemmas in parallel (None: number of cores)
+        cache_dir: folder of the cache files
+        serialize: whether the updated graph is also exported in the turtle format (the whole file is written again if a lemma has changed)
+        graph_path: path of the turtle file, .gz or .zst compresses it (default: ./graphs/{dataset_name}.ttl)
+        g: graph returned by load_kg() or update_kg() that is updated in place (None: the graph is loaded from the cache)
+    @returns g: RDF-graph
+    '''
+    from create_kg import bind_namespaces, model_dataset
+
+    if annotated_words is None:
+        from explore_data import find_variation_words
+        annotated_words = find_variation_words()
+
+    manifest = read_manifest(f"{cache_dir}/{dataset_name}_manifest.json", dataset_name, language)
+    stored_manifest = json.dumps(manifest, sort_keys=True)
+    key = update_shards(data_path, dataset_name, annotated_words, language, num_workers, cache_dir, manifest)
+    shards = {lemma: lemma_info["shard"] for lemma, lemma_info in manifest["lemmas"].items()}
+
+    snapshot_path = f"{cache_dir}/{dataset_name}_graph.pickle"
+    if g is not None:
+        registered = registered_graph(g)
+        if registered is None or registered[3] is None:
+            raise ValueError("the graph has not been loaded from the cache or has changed since")
+        old_shards = registered[3]
+    elif manifest["snapshot"] is not None and os.path.isfile(snapshot_path) and all(os.path.isfile(shard_path(cache_dir, dataset_name, lemma, shard)) for lemma, shard in manifest["snapshot"].items()):
+        print(f"loading {dataset_name} from the cache...")
+        with stage("load_snapshot"):
+            g = load_snapshot(snapshot_path)
+        old_shards = manifest["snapshot"]
+    else:
+        g = new_graph()
+        bind_namespaces(g)
+        model_dataset(g, dataset_name)
+        old_shards = manifest["snapshot"] = dict()
+    changed_lemmas = apply_shards(g, cache_dir, dataset_name, old_shards, shards)
+
+    snapshot = manifest["snapshot"]
+    if snapshot is None or not os.path.isfile(snapshot_path) or sum(snapshot.get(lemma) != shards.get(lemma) for lemma in set(snapshot) | set(shards)) > SNAPSHOT_LAG * len(shards):
+        with stage("save_snapshot"):
+            save_snapshot(g, snapshot_path)
+        manifest["snapshot"] = dict(shards)
+    if json.dumps(manifest, sort_keys=True) != stored_manifest:
+        write_manifest(cache_dir, dataset_name, manifest)
+
+    if serialize and changed_lemmas:
+        with stage("serialize"):
+            serialize_graph(g, graph_path or f"./graphs/{dataset_name}.ttl")
+    register_graph(g, f"{cache_dir}/{dataset_name}_{key[:16]}", shards)
+    return g
+
+@profiled("load_kg")
+def load_kg(data_path = "./dwug_en/data", dataset_name = "dwug_en", annotated_words = None, language = "en", num_workers = 1, cache_dir = "./resources/cache", serialize = False, store_path = None, graph_path = None):
+    '''
+    This function loads the knowledge graph from the cache and only rebuilds it if the input csv files or build parameters have changed.
+
+    The csv files are compared with the manifest by their size and modification time and the graph is loaded from its snapshot, which restores the indexes of the store
+    without inserting the triples again. The rebuild is incremental, only the lemmas with changed csv files are built again (see update_kg()).
+
+    @params
+        data_path: path to the data folder
+        dataset_name: name of the dataset
+        annotated_words: list of words that should be included (default: words annotated by all annotators)
+        language: language of the dataset
+        num_workers: number of processes used for a rebuild (None: number of cores)
+        cache_dir: folder of the cache files
+        serialize: whether a rebuilt graph is also stored in the turtle format
+        store_path: path of an SQLite database the graph is stored in (None: the graph is loaded into memory)
+        graph_path: path of the turtle file of a rebuilt graph, .gz or .zst compresses it (default: ./graphs/{dataset_name}.ttl)
+    @returns g: RDF-graph
+    '''
+    if annotated_words is None:
+        from explore_data import find_variation_words
+        annotated_words = find_variation_words()
+
+    if store_path is not None:
+        return load_store(store_path, data_path=data_path, dataset_name=dataset_name, annotated_words=annotated_words, language=language, num_workers=num_workers, cache_dir=cache_dir, serialize=serialize, graph_path=graph_path)
+
+    # the csv files are only compared by their size and modification time, the snapshot is loaded without inserting the triples again
+    return update_kg(data_path=data_path, dataset_name=dataset_name, annotated_words=annotated_words, language=language, num_workers=num_workers, cache_dir=cache_dir, serialize=serialize, graph_path=graph_path)
+
+def load_store(store_path, data_path = "./dwug_en/data", dataset_name = "dwug_en", annotated_words = None, language = "en", num_workers = 1, cache_dir = "./resources/cache", serialize = False, graph_path = None):
+    '''
+    This function opens the knowledge graph stored in an SQLite database and brings it up to date with the input csv files.
+
+    The triples stay on disk, queries are answered with the indexes of the database. The lemma files of the cache are updated as for the in-memory graph (see update_shards())
+    and the meta table of the database stores the version of each lemma in the database. Only the triples of the changed lemmas are retracted and added (see apply_shards()),
+    in one transaction. A new database (or one whose lemma files are no longer in the cache) is filled from all lemma files.
+
+    @params
+        store_path: path of the database file
+        data_path: path to the data folder
+        dataset_name: name of the dataset
+        annotated_words: list of words that should be included
+        language: language of the dataset
+        num_workers: number of processes building the changed lemmas in parallel (None: number of cores)
+        cache_dir: folder of the cache files
+        serialize: whether an updated graph is also exported in the turtle format
+        graph_path: path of the turtle file of an updated graph (see load_kg())
+    @returns g: RDF-graph backed by the database
+    '''
+    from sqlite_store import open_graph
+    from create_kg import bind_namespaces, model_dataset
+
+    manifest = read_manifest(f"{cache_dir}/{dataset_name}_manifest.json", dataset_name, language)
+    stored_manifest = json.dumps(manifest, sort_keys=True)
+    update_shards(data_path, dataset_name, annotated_words, language, num_workers, cache_dir, manifest)
+    shards = {lemma: lemma_info["shard"] for lemma, lemma_info in manifest["lemmas"].items()}
+
+    g = open_graph(store_path)
+    stored_shards = json.loads(g.store.get_meta("shards") or "null")
+    if stored_shards is None or not all(os.path.isfile(shard_path(cache_dir, dataset_name, lemma, shard)) for lemma, shard in stored_shards.items() if shards.get(lemma) != shard):
+        g.close()
+        g = open_graph(store_path, clear=True)
+        bind_namespaces(g)
+        model_dataset(g, dataset_name)
+        stored_shards = dict()
+
+    if stored_shards == shards:
+        print(f"loading {dataset_name} from {store_path}...")
+    else:
+        try:
+            apply_shards(g, cache_dir, dataset_name, stored_shards, shards)
+            g.store.set_meta("shards", json.dumps(shards))
+            g.commit()
+        except BaseException:
+            g.rollback()
+            raise
+        if serialize:
+            with stage("serialize"):
+                serialize_graph(g, graph_path or f"./graphs/{dataset_name}.ttl")
+
+    # the lemma files of the database are kept until it has been updated
+    manifest["stores"][os.path.abspath(store_path)] = shards
+    if json.dumps(manifest, sort_keys=True) != stored_manifest:
+        write_manifest(cache_dir, dataset_name, manifest)
+    register_graph(g, store_revision_path(g, store_path))
+    return g
+
+def store_revision_path(g, store_path):
+    '''
+    This function returns the prefix of the files derived from the current content of a database (see register_graph()) and removes the files of older contents.
+
+    @params
+        g: RDF-graph backed by the database
+        store_path: path of the database file
+    @returns cache_path: prefix of the files, it contains the revision of the database (see sqlite_store.SQLiteStore.commit(), None: the database has no revision)
+    '''
+    revision = g.store.get_meta("revision")
+    if revision is None:
+        return None
+    cache_path = f"{os.path.splitext(store_path)[0]}_{revision[:16]}"
+    for stale_path in glob.glob(f"{os.path.splitext(store_path)[0]}_{'?' * 16}_*.npz"):
+        if not stale_path.startswith(cache_path + "_"):
+            os.remove(stale_path)
+    return cache_path
+
+@profiled("read_kg")
+def read_kg(graph_path):
+    '''
+    This function loads a serialized knowledge graph (e.g. graphs/dwug_en.ttl) instead of building it from the csv files.
+
+    Compressed files (graphs/dwug_en.ttl.gz, graphs/dwug_en.ttl.zst) are decompressed while they are parsed.
+
+    @param graph_path: path of the graph file, the codec and the format are chosen from its extension
+    @returns g: RDF-graph
+    '''
+    from create_kg import bind_namespaces
+
+    print(f"loading {graph_path}...")
+    g = new_graph()
+    bind_namespaces(g)
+    return parse_graph(graph_path, g)
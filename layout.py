@@ -0,0 +1,172 @@
+from rdflib import URIRef, Literal, XSD
+from collections.abc import Mapping
+import numpy as np
+import hashlib
+import os
+
+# increase when the placement changes, stored layouts are then computed again
+LAYOUT_VERSION = 1
+
+# golden angle in radians, consecutive points of the sunflower layout are rotated by it
+GOLDEN_ANGLE = np.pi * (3 - np.sqrt(5))
+
+class Layout(Mapping):
+    '''
+    This class stores the positions of the nodes in one array and maps each node to its row.
+
+    It can be used like the dictionary returned by nx.spring_layout() (node -> position).
+    '''
+    def __init__(self, nodes, positions, fingerprint):
+        self.nodes = nodes
+        self.positions = positions
+        self.fingerprint = fingerprint
+        self.index = {node: i for i, node in enumerate(nodes)}
+
+    def __getitem__(self, node):
+        return self.positions[self.index[node]]
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def rows(self, nodes):
+        '''
+        This function looks up the rows of several nodes.
+
+        @param nodes: iterable of nodes
+        @returns rows: array of the row of each node in positions
+        '''
+        return np.fromiter((self.index[node] for node in nodes), dtype=np.int64)
+
+    def save(self, path):
+        '''
+        This function stores the layout in a npz file.
+
+        Annotators (URIs) and annotation labels (literals) are stored as strings with a flag.
+
+        @param path: path of the npz file
+        '''
+        np.savez(path, nodes=np.array([str(node) for node in self.nodes], dtype=str), is_uri=np.array([isinstance(node, URIRef) for node in self.nodes], dtype=bool), positions=self.positions, fingerprint=np.array(self.fingerprint))
+
+    @staticmethod
+    def load(path):
+        '''
+        This function loads a layout stored with save().
+
+        @param path: path of the npz file
+        @returns layout: Layout
+        '''
+        with np.load(path) as arrays:
+            nodes = [URIRef(node) if is_uri else Literal(node, datatype=XSD.string) for node, is_uri in zip(arrays["nodes"].tolist(), arrays["is_uri"].tolist())]
+            return Layout(nodes, arrays["positions"], str(arrays["fingerprint"]))
+
+def hash_nodes(nodes, seed = 0):
+    '''
+    This function computes a seeded 64-bit hash of every node.
+
+    Unlike hash(), the values are the same in every session.
+
+    @params
+        nodes: list of nodes
+        seed: seed of the hash
+    @returns hashes: array of unsigned 64-bit integers
+    '''
+    key = seed.to_bytes(8, "little")
+    digests = b"".join(hashlib.blake2b(str(node).encode("utf-8"), digest_size=8, key=key).digest() for node in nodes)
+    return np.frombuffer(digests, dtype="<u8")
+
+def layout_fingerprint(nodes, method, seed):
+    '''
+    This function identifies a layout by its nodes and placement.
+
+    @params
+        nodes: list of nodes
+        method: placement (see disc_layout())
+        seed: seed of the placement
+    @returns fingerprint: hex digest
+    '''
+    fingerprint = hashlib.sha256(f"{LAYOUT_VERSION}|{method}|{seed}".encode("utf-8"))
+    for node in sorted(str(node) for node in nodes):
+        fingerprint.update(b"|" + node.encode("utf-8"))
+    return fingerprint.hexdigest()
+
+def disc_layout(nodes, radius = 2000, method = "sunflower", seed = 0):
+    '''
+    This function places the nodes on a disc without any iterations.
+
+    The nodes have no edges in the visualizations, so a force-directed layout only scatters them. Both placements are computed with NumPy in O(n log n):
+        sunflower: the nodes are ordered by their hash and placed on a sunflower spiral (evenly spaced)
+        hash: every node is placed by its own hash (uniform on the disc, a node keeps its position if other nodes are added)
+
+    @params
+        nodes: list of nodes
+        radius: radius of the disc
+        method: sunflower or hash
+        seed: seed of the hash
+    @returns layout: Layout
+    '''
+    hashes = hash_nodes(nodes, seed)
+    if method == "sunflower":
+        rank = np.empty(len(nodes), dtype=np.float64)
+        rank[np.argsort(hashes, kind="stable")] = np.arange(len(nodes))
+        distance = np.sqrt((rank + 0.5) / max(len(nodes), 1))
+        angle = rank * GOLDEN_ANGLE
+    elif method == "hash":
+        # the upper and lower 32 bits are two independent uniform values
+        distance = np.sqrt((hashes >> np.uint64(32)).astype(np.float64) / 2**32)
+        angle = (hashes & np.uint64(0xFFFFFFFF)).astype(np.float64) / 2**32 * 2 * np.pi
+    else:
+        raise ValueError(f"unknown layout method: {method}")
+
+    positions = np.column_stack((np.cos(angle), np.sin(angle))) * (distance * radius)[:, None]
+    return Layout(list(nodes), positions.astype(np.float32), layout_fingerprint(nodes, method, seed))
+
+def load_layout(nodes, path, radius = 2000, method = "sunflower", seed = 0):
+    '''
+    This function loads the stored layout of the nodes and only computes it again if the nodes or the placement have changed.
+
+    @params
+        nodes: list of nodes
+        path: path of the npz file
+        radius, method, seed: see disc_layout()
+    @returns layout: Layout
+    '''
+    fingerprint = layout_fingerprint(nodes, method, seed)
+    if os.path.isfile(path):
+        layout = Layout.load(path)
+        if layout.fingerprint == fingerprint:
+            return layout
+
+    layout = disc_layout(nodes, radius, method, seed)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    layout.save(path)
+    return layout
+
+def column_layout(columns, heights, width = 4, gap = 0.3):
+    '''
+    This function places boxes in columns from left to right, the boxes of each column are stacked from top to bottom and centered vertically.
+
+    The positions only depend on the order of the nodes, so the same graph is always drawn in the same way.
+
+    @params
+        columns: list of columns (lists of nodes)
+        heights: dictionary of the box height of each node
+        width: width of a column
+        gap: space between two boxes
+    @returns
+        positions: dictionary of the center of each box
+        size: width and height of the layout
+    '''
+    totals = [sum(heights[node] for node in column) + gap * max(len(column) - 1, 0) for column in columns]
+    height = max(totals, default=0) + 2 * gap
+
+    positions = dict()
+    for i, (column, total) in enumerate(zip(columns, totals)):
+        top = (height + total) / 2
+        for node in column:
+            positions[node] = ((i + 0.5) * width, top - heights[node] / 2)
+            top -= heights[node] + gap
+    return positions, (width * len(columns), height)
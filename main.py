@@ -1,15 +1,12 @@
-from create_kg import create_kg
-from visualize_kg import inspect_instance, create_annotation_pos, get_colors, create_full_annotation_vis, create_single_annotator_vis
-import rdflib
-from tqdm import tqdm 
-from query_kg import category_stats, annotations_per_annotator, filter_variation, get_pos_tags
+import sys
+from kg_cache import load_kg, read_kg
+from visualize_kg import inspect_instance
+from render_kg import render_visualizations
+from query_kg import category_stats, annotations_per_annotators, filter_variation, get_pos_tags
 
-# Create a Graph
-g = create_kg()
-
-# use this instead of g = create_kg() if the turtle file exists already
-#g = rdflib.Graph()
-#result = g.parse("./graphs/dwug_en.ttl", format='turtle').serialize(format="turtle")
+# Create a Graph (loaded from ./resources/cache, only the lemmas with changed csv files are rebuilt)
+# or load a serialized graph given as argument (e.g. graphs/dwug_en.ttl.gz)
+g = read_kg(sys.argv[1]) if len(sys.argv) > 1 else load_kg(serialize=True)
     
 # Visualize
 # Instance level
@@ -18,23 +15,12 @@ high_variation_pair = ["circled_mag_1856_590750.txt-21-18","circling_fic_1849_72
 inspect_instance(g, no_variation_pair)
 inspect_instance(g, high_variation_pair)
 
-# Full visualization 
-pos = create_annotation_pos(g)
-
-for color_mode in ["distinct", "range"]:
-    color_dict = get_colors(g, color_mode)
-    create_full_annotation_vis(g, pos, color_dict, color_mode)
-
-    # Annotator visualization 
-    for i in tqdm(range(13), desc="Creating annotator visualizations"):
-        create_single_annotator_vis(g, f"annotator{i}", pos, color_dict, color_mode)
-
-        # only generate once
-        if color_mode == "distinct":
-            annotations_per_annotator(g, annotator=f"annotator{i}") # get annotated sentences per annotator
+# Full and annotator visualizations (rendered in parallel, one process per core)
+render_visualizations(g, color_modes=["distinct", "range"], full=True, annotators=[f"annotator{i}" for i in range(13)])
 
 # Query
 category_stats(g) # count label frequencies
+annotations_per_annotators(g, annotators=[f"annotator{i}" for i in range(13)]) # get annotated sentences per annotator
 filter_variation(g, start = 1, end=1) # get no variation   
 filter_variation(g, start = 2) # get high variation
 get_pos_tags(g) # all pos tags in the dataset
@@ -0,0 +1,181 @@
+from contextlib import contextmanager
+from functools import wraps
+import resource
+import atexit
+import json
+import time
+import csv
+import sys
+import os
+
+# The profiler is disabled unless enable() is called (e.g. by cli.py --profile) or the environment variable HLV_PROFILE names a report folder.
+# Stages of worker processes are not recorded.
+
+# state of the enabled profiler (None: disabled)
+_state = None
+
+def current_rss():
+    '''
+    This function returns the resident set size of the process.
+
+    @returns rss: RSS in MB (peak RSS if the current RSS is not available)
+    '''
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError):
+        return peak_rss()
+
+def peak_rss():
+    '''
+    This function returns the peak resident set size of the process.
+
+    @returns peak: peak RSS in MB
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+def enable(report_dir = "./reports", cprofile = False):
+    '''
+    This function enables the profiler, the report is written when the program exits (or with write_report()).
+
+    @params
+        report_dir: folder of the report
+        cprofile: whether a cProfile dump is stored for every top-level stage
+    '''
+    global _state
+    if _state is None:
+        atexit.register(write_report)
+    _state = {"report_dir": report_dir, "cprofile": cprofile, "stages": [], "lemmas": [], "queries": [], "path": [], "profile": None}
+
+def disable():
+    '''
+    This function disables the profiler without writing the report.
+    '''
+    global _state
+    _state = None
+
+def is_enabled():
+    '''
+    @returns enabled: whether the profiler is enabled
+    '''
+    return _state is not None
+
+@contextmanager
+def stage(name):
+    '''
+    This context manager records the wall time, CPU time and memory of a stage.
+
+    Stages can be nested, the name of a nested stage contains the names of the outer stages (e.g. load_kg/update_kg).
+    The stage yields a dictionary in which the number of result rows of the stage can be set (key rows).
+
+    @param name: name of the stage
+    '''
+    if _state is None:
+        yield dict()
+        return
+
+    state = _state
+    state["path"].append(name)
+    full_name = "/".join(state["path"])
+
+    profile = None
+    if state["cprofile"] and state["profile"] is None:
+        # only one profiler can be active, so nested stages are part of the dump of their top-level stage
+        import cProfile
+        profile = state["profile"] = cProfile.Profile()
+        profile.enable()
+
+    info = {"rows": None}
+    rss_start = current_rss()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield info
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        rss_end = current_rss()
+        if profile is not None:
+            profile.disable()
+            state["profile"] = None
+            os.makedirs(state["report_dir"], exist_ok=True)
+            # numbered in the order of the stages, so that repeated stages do not overwrite each other
+            profile.dump_stats(f"{state['report_dir']}/{len(state['stages']):03d}_{full_name.replace('/', '__').replace(':', '_')}.prof")
+        state["path"].pop()
+        state["stages"].append({"stage": full_name, "wall_seconds": round(wall, 6), "cpu_seconds": round(cpu, 6), "rss_start_mb": round(rss_start, 1), "rss_end_mb": round(rss_end, 1), "rss_delta_mb": round(rss_end - rss_start, 1), "peak_rss_mb": round(peak_rss(), 1), "rows": info["rows"]})
+
+def profiled(name, rows = None):
+    '''
+    This decorator records every call of a function as a stage (see stage()).
+
+    @params
+        name: name of the stage
+        rows: function that counts the result rows of the function, they are recorded with the stage (None: no rows are recorded)
+    '''
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _state is None:
+                return function(*args, **kwargs)
+            with stage(name) as info:
+                result = function(*args, **kwargs)
+                if rows is not None:
+                    # the SPARQL queries of the function are recorded by sparql_queries.run_query()
+                    info["rows"] = rows(result)
+                return result
+        return wrapper
+    return decorator
+
+def record_lemma(lemma, seconds, triples):
+    '''
+    This function records the build of one lemma.
+
+    @params
+        lemma: name of the lemma
+        seconds: wall time of the build
+        triples: number of emitted triples
+    '''
+    if _state is not None:
+        _state["lemmas"].append({"lemma": lemma, "seconds": round(seconds, 6), "triples": triples})
+
+def record_query(name, parse_seconds, eval_seconds, rows, cached = False):
+    '''
+    This function records the evaluation of one query.
+
+    @params
+        name: name of the query
+        parse_seconds: time of parsing and translating the query (0 if it had already been prepared)
+        eval_seconds: time of the evaluation
+        rows: number of result rows (triples of CONSTRUCT queries)
+        cached: whether the result was taken from the result cache
+    '''
+    if _state is not None:
+        _state["queries"].append({"query": name, "stage": "/".join(_state["path"]), "parse_seconds": round(parse_seconds, 6), "eval_seconds": round(eval_seconds, 6), "rows": rows, "cached": cached})
+
+def write_report():
+    '''
+    This function writes the report of the profiler: report.json with all records and one csv file each for the stages, lemmas and queries.
+
+    @returns path: path of report.json (None if the profiler is disabled)
+    '''
+    if _state is None:
+        return None
+
+    report_dir = _state["report_dir"]
+    os.makedirs(report_dir, exist_ok=True)
+    report = {kind: _state[kind] for kind in ("stages", "lemmas", "queries")}
+    with open(f"{report_dir}/report.json", "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+
+    for kind, records in report.items():
+        if records:
+            with open(f"{report_dir}/{kind}.csv", "w", encoding="utf-8", newline="") as csv_file:
+                writer = csv.DictWriter(csv_file, fieldnames=list(records[0]))
+                writer.writeheader()
+                writer.writerows(records)
+    return f"{report_dir}/report.json"
+
+if os.environ.get("HLV_PROFILE"):
+    enable(os.environ["HLV_PROFILE"], cprofile=os.environ.get("HLV_CPROFILE", "") not in ("", "0"))
@@ -1,41 +1,250 @@
-import rdflib
+from rdflib import Literal
+from sparql_queries import run_query, string_literal
+from profiler import profiled
+from kg_cache import load_kg, read_kg
+from compressed_io import open_file
+from result_sinks import write_columnar
+from annotation_table import get_annotation_table, get_pair_variation, is_numeric
+from create_kg import NIF, RDAIO, HLV, intern_uri
+from rdflib.namespace import RDFS
+from rdflib import Graph
+from rdflib.graph import ModificationException
+from rdflib.paths import Path
+from collections import namedtuple, defaultdict
+import csv
+import sys
+
+VariationRow = namedtuple("VariationRow", ["annotation_lbl", "num_distinct_lbls", "num_total_lbls", "range"])
+AnnotationRow = namedtuple("AnnotationRow", ["annotation_lbl", "category", "sentence"])
+CategoryRow = namedtuple("CategoryRow", ["category", "num_annotated", "num_distinct_sentence_pairs", "num_annotators", "annotators"])
+
+# appended to the csv files of the query results to compress them (e.g. ".gz" or ".zst", see compressed_io.py)
+RESULT_COMPRESSION = ""
+# formats of the stored query results: csv and the columnar formats parquet and arrow (see result_sinks.py)
+RESULT_FORMATS = ["csv"]
+
+def result_path(name):
+    '''
+    This function returns the path of the csv file of a query result.
+
+    @param name: name of the result relative to ./query_results (e.g. variation/variations_2_None)
+    @returns path: path of the (compressed) csv file
+    '''
+    return f"./query_results/{name}.csv{RESULT_COMPRESSION}"
+
+def write_csv(path, header, rows):
+    '''
+    This function stores query results in a csv file (in the same format as qres.serialize()).
+
+    @params
+        path: path of the csv file, .gz or .zst compresses it
+        header: list of the column names
+        rows: list of the result rows
+    '''
+    with open_file(path, "wt", encoding="utf-8", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def write_result(qres, path):
+    '''
+    This function stores the result of a SPARQL query in a csv file, the rows are compressed while they are written.
+
+    @params
+        qres: result of the query
+        path: path of the csv file, .gz or .zst compresses it
+    '''
+    with open_file(path, "wb") as csv_file:
+        qres.serialize(csv_file, encoding="utf-8", format="csv")
+
+def store_rows(name, fields, rows):
+    '''
+    This function stores query results in every format of RESULT_FORMATS.
+
+    @params
+        name: name of the result relative to ./query_results (e.g. num_labels)
+        fields: list of the column names
+        rows: list of the result rows
+    '''
+    for result_format in RESULT_FORMATS:
+        if result_format == "csv":
+            write_csv(result_path(name), fields, rows)
+        else:
+            write_columnar(f"./query_results/{name}.{result_format}", fields, rows)
+
+def store_result(name, qres):
+    '''
+    This function stores the result of a SPARQL query in every format of RESULT_FORMATS.
+
+    @params
+        name: name of the result relative to ./query_results (e.g. num_labels)
+        qres: result of the query
+    '''
+    for result_format in RESULT_FORMATS:
+        if result_format == "csv":
+            write_result(qres, result_path(name))
+        else:
+            write_columnar(f"./query_results/{name}.{result_format}", [str(var) for var in qres.vars], qres)
+
+class DatasetUnion(Graph):
+    '''
+    This class is a read-only view of several named graphs of a Dataset.
+
+    Every triple is returned once, even if several of the graphs contain it (e.g. the annotator nodes, which every dataset has),
+    so the SPARQL queries count the triples of the union like the annotation table.
+    '''
+    def __init__(self, ds, graphs):
+        super().__init__(store=ds.store, namespace_manager=ds.namespace_manager)
+        self.graph_ids = frozenset(graph.identifier for graph in graphs)
+
+    def triples(self, triple):
+        s, p, o = triple
+        if isinstance(p, Path):
+            for path_s, path_o in p.eval(self, s, o):
+                yield path_s, p, path_o
+            return
+        # the store returns each triple once with all graphs that contain it
+        for found_triple, contexts in self.store.triples((s, p, o), context=None):
+            if any(context.identifier in self.graph_ids for context in contexts):
+                yield found_triple
+
+    def __len__(self):
+        return sum(1 for _ in self.triples((None, None, None)))
+
+    def add(self, triple):
+        raise ModificationException()
+
+    def addN(self, quads):
+        raise ModificationException()
+
+    def remove(self, triple):
+        raise ModificationException()
+
+def select_datasets(ds, dataset_names):
+    '''
+    This function restricts the queries to some of the named graphs of a Dataset (see create_kg.create_dataset()).
+
+    All query functions accept the returned graph. The cached tables belong to the returned graph,
+    so it should be kept for several queries instead of being selected again for each query.
+
+    @params
+        ds: Dataset with one named graph per dataset
+        dataset_names: name of one dataset or list of names
+    @returns g: named graph of the dataset (DatasetUnion of the named graphs for several datasets)
+    '''
+    if isinstance(dataset_names, str):
+        dataset_names = [dataset_names]
+    graphs = [ds.graph(intern_uri(dataset_name, HLV)) for dataset_name in dataset_names]
+    if len(graphs) == 1:
+        return graphs[0]
+    return DatasetUnion(ds, graphs)
+
+def variation_rows(g, start = None, end = None):
+    '''
+    This function filters the pair variation view of the graph.
+
+    @params
+        g: RDF-graph
+        start: minimal number of distinct labels (None: no minimum)
+        end: maximal number of distinct labels (None: no maximum)
+    @returns rows: list of VariationRows ordered like the SPARQL queries
+    '''
+    view = get_pair_variation(g)
+    mask = view.mask(start, end)
+    return [VariationRow(*row) for row in zip(view.annotation_lbls[mask].tolist(), view.num_distinct_lbls[mask].tolist(), view.num_total_lbls[mask].tolist(), view.lbl_range[mask].tolist())]
 
-def category_stats(g):
+def engine_mismatches(g):
+    '''
+    This function checks that the table engine and the SPARQL engine of the queries give the same results on a graph
+    (e.g. on the union of several datasets, see select_datasets()).
+
+    @param g: RDF-graph
+    @returns mismatches: list of the names of the queries whose results differ
+    '''
+    mismatches = []
+    # GROUP_CONCAT does not define the order of the annotators
+    table_rows = [(*row[:4], sorted(row[4].split(" | "))) for row in get_annotation_table(g).category_stats()]
+    sparql_rows = [(int(row.category), int(row.num_annotated), int(row.num_distinct_sentence_pairs), int(row.num_annotators), sorted(str(row.annotators).split(" | "))) for row in run_query(g, "category_stats")]
+    if table_rows != sparql_rows:
+        mismatches.append("category_stats")
+
+    sparql_rows = [(str(row.annotation_lbl), int(row.num_distinct_lbls), int(row.num_total_lbls), int(row.range)) for row in run_query(g, "num_labels")]
+    if [tuple(row) for row in variation_rows(g)] != sparql_rows:
+        mismatches.append("num_labels")
+    return mismatches
+
+@profiled("query:category_stats", rows=len)
+def category_stats(g, engine = "table"):
     '''
     This functions queries the graph to collect information about the categories.
 
     This query answers the question: How often has a label been annotated?
 
-    @param g: RDF-graph
+    @params
+        g: RDF-graph
+        engine: 
+            table: the result is computed with the annotation table of the graph
+            sparql: the result is computed with the SPARQL query
     @returns qres: the result of the query
     '''
-    category_query = f"""
-    PREFIX nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#> 
-    PREFIX rdaa: <http://rdaregistry.info/Elements/a/> 
-    PREFIX rdai: <http://rdaregistry.info/Elements/i/> 
-    PREFIX rdaio: <http://rdaregistry.info/Elements/i/object/>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
-    PREFIX schema: <https://schema.org/> 
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> 
-
-    SELECT DISTINCT ?category (COUNT(?category) as ?num_annotated) (COUNT(DISTINCT ?annotation_lbl) as ?num_distinct_sentence_pairs) (COUNT(DISTINCT ?annotator) as ?num_annotators) (GROUP_CONCAT(DISTINCT ?annotator; separator=" | ") as ?annotators)
-    WHERE {{
-        ?annotation nif:category ?category ;
-            rdfs:label ?annotation_lbl ;
-            rdaio:P40015/rdfs:label ?annotator .
-
-        FILTER(isNumeric(?category))
-    }} 
-    GROUP BY ?category
-    ORDER BY ?category ?annotators
-    """
-    qres = g.query(category_query)
-
-    # store results in a csv file
-    qres.serialize(f"./query_results/category_stats.csv", encoding='utf-8', format='csv')
+    if engine == "table":
+        rows = [CategoryRow(*row) for row in get_annotation_table(g).category_stats()]
+        store_rows("category_stats", CategoryRow._fields, rows)
+        return rows
+
+    qres = run_query(g, "category_stats")
+
+    # store results in the formats of RESULT_FORMATS
+    store_result("category_stats", qres)
     return qres
 
-def annotations_per_annotator(g, annotator):
+@profiled("query:annotations_per_annotators", rows=lambda annotator_rows: sum(map(len, annotator_rows.values())))
+def annotations_per_annotators(g, annotators = None):
+    '''
+    This function collects the annotations of several annotators in one pass over the annotations.
+
+    It answers the same question as annotations_per_annotator() and stores one csv file per annotator.
+
+    @params 
+        g: RDF-graph
+        annotators: list of the annotators for which the annotations are collected (None: all annotators)
+    @returns annotator_rows: dictionary mapping each annotator to its list of AnnotationRows
+    '''
+    annotator_rows = collect_annotator_rows(g, annotators)
+    for annotator, rows in annotator_rows.items():
+        store_rows(f"annotator/{annotator}", AnnotationRow._fields, rows)
+    return annotator_rows
+
+def collect_annotator_rows(g, annotators = None):
+    '''
+    This function collects the annotations of several annotators in one pass over the annotations without storing them.
+
+    @params 
+        g: RDF-graph
+        annotators: list of the annotators for which the annotations are collected (None: all annotators)
+    @returns annotator_rows: dictionary mapping each annotator to its list of AnnotationRows (ordered by annotation label and category)
+    '''
+    labels = dict()
+    annotator_rows = defaultdict(set) if annotators is None else {annotator: set() for annotator in annotators}
+
+    for annotation, annotator_uri in g.subject_objects(RDAIO.P40015):
+        if annotator_uri not in labels:
+            labels[annotator_uri] = str(g.value(annotator_uri, RDFS.label))
+        annotator = labels[annotator_uri]
+        if annotators is not None and annotator not in annotator_rows:
+            continue
+
+        sentence = " || ".join(str(sentencestr) for word in g.subjects(NIF.annotation, annotation) for sentence_uri in g.objects(word, NIF.referenceContext) for sentencestr in g.objects(sentence_uri, NIF.isString))
+        for annotation_lbl in g.objects(annotation, RDFS.label):
+            for category in g.objects(annotation, NIF.category):
+                if not is_numeric(category):
+                    annotator_rows[annotator].add(AnnotationRow(str(annotation_lbl), str(category), sentence))
+
+    # ORDER BY ?annotation_lbl ?category
+    return {annotator: sorted(rows, key=lambda row: (row.annotation_lbl, row.category)) for annotator, rows in annotator_rows.items()}
+
+@profiled("query:annotations_per_annotator", rows=len)
+def annotations_per_annotator(g, annotator, engine = "batch"):
     '''
     This functions queries the graph to collect all annotation of one annotator.
 
@@ -44,131 +253,78 @@ def annotations_per_annotator(g, annotator):
     @params 
         g: RDF-graph
         annotator: the annotator for which the annotations are collected
+        engine: 
+            batch: the result is computed with annotations_per_annotators()
+            sparql: the result is computed with the SPARQL query
     @returns qres: the result of the query
     '''
-    annotations_query = f"""
-    PREFIX nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#> 
-    PREFIX rdaa: <http://rdaregistry.info/Elements/a/> 
-    PREFIX rdai: <http://rdaregistry.info/Elements/i/> 
-    PREFIX rdaio: <http://rdaregistry.info/Elements/i/object/>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
-    PREFIX schema: <https://schema.org/> 
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> 
-
-    SELECT DISTINCT ?annotation_lbl ?category (GROUP_CONCAT(?sentencestr; separator=" || ") as ?sentence)
-    WHERE {{
-        ?annotator rdfs:label "{annotator}"^^xsd:string .
-
-        ?annotation rdaio:P40015 ?annotator;
-            rdfs:label ?annotation_lbl ;
-            nif:category ?category .
-        
-        FILTER(!isNumeric(?category))
-
-        ?word nif:annotation ?annotation; 
-            nif:referenceContext/nif:isString ?sentencestr .
-
-    }} 
-    GROUP BY ?annotation
-    ORDER BY ?annotation_lbl ?category ?sentences
-    """
-    qres = g.query(annotations_query)
-
-    # store results in a csv file
-    qres.serialize(f"./query_results/annotator/{annotator}.csv", encoding='utf-8', format='csv')
+    if engine == "batch":
+        return annotations_per_annotators(g, [annotator])[annotator]
+
+    qres = run_query(g, "annotations_per_annotator", annotator_name=string_literal(annotator))
+
+    # store results in the formats of RESULT_FORMATS
+    store_result(f"annotator/{annotator}", qres)
     return qres
 
-def num_labels(g):
+@profiled("query:num_labels", rows=len)
+def num_labels(g, engine = "table"):
     '''
     This functions queries the graph to collect information about the variation of the annotations.
 
     This query answers the question: How many distinct labels has a annotation and how much do they differ from each other?
     
-    @param g: RDF-graph
+    @params
+        g: RDF-graph
+        engine: 
+            table: the result is computed with the annotation table of the graph
+            sparql: the result is computed with the SPARQL query
     @returns qres: the result of the query
     '''
-    num_labels_query = """
-    PREFIX nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#> 
-    PREFIX rdaa: <http://rdaregistry.info/Elements/a/> 
-    PREFIX rdai: <http://rdaregistry.info/Elements/i/> 
-    PREFIX rdaio: <http://rdaregistry.info/Elements/i/object/>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
-    PREFIX schema: <https://schema.org/> 
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> 
-
-    SELECT ?annotation_lbl (COUNT(DISTINCT ?category) as ?num_distinct_lbls) (COUNT(?annotation_lbl)/2 as ?num_total_lbls) (MAX(?category) - MIN(?category) as ?range)
-    WHERE {
-        ?annotation nif:category ?category ;
-            rdfs:label ?annotation_lbl .
-
-        ?word1 nif:annotation ?annotation ;
-            nif:lemma ?lemma ;
-            nif:referenceContext/rdfs:label ?sentence1ID .
-        ?word2 nif:annotation ?annotation ;
-            nif:referenceContext/rdfs:label ?sentence2ID .
-
-        FILTER (isNumeric(?category))
-        FILTER (?sentence1ID != ?sentence2ID)
-    }
-    GROUP BY ?annotation_lbl
-    ORDER BY ?num_distinct_lbls ?num_total_lbls ?range ?annotation_lbl"""
-    qres = g.query(num_labels_query)
-
-    # store results in a csv file
-    qres.serialize("./query_results/num_labels.csv", encoding='utf-8', format='csv')
+    if engine == "table":
+        rows = variation_rows(g)
+        store_rows("num_labels", VariationRow._fields, rows)
+        return rows
+
+    qres = run_query(g, "num_labels")
+
+    # store results in the formats of RESULT_FORMATS
+    store_result("num_labels", qres)
     return qres
 
-def filter_variation(g, start, end = None):
+@profiled("query:filter_variation", rows=len)
+def filter_variation(g, start, end = None, engine = "table"):
     '''
     This query returns all annotations with at least a number of <start> distinct labels and a maximum of <end> distinct labels.
 
     It is a more fine-grained duplicate of num_labels().
 
-    @param g: RDF-graph
+    @params
+        g: RDF-graph
+        start: minimal number of distinct labels
+        end: maximal number of distinct labels (None: no maximum)
+        engine: 
+            table: the result is computed with the annotation table of the graph
+            sparql: the result is computed with the SPARQL query
     @returns qres: the result of the query
     '''
-    condition = ""
+    if engine == "table":
+        rows = variation_rows(g, start, end)
+        store_rows(f"variation/variations_{start}_{end}", VariationRow._fields, rows)
+        return rows
+
     if start == end:
-        condition = f"HAVING (COUNT(DISTINCT ?category) = {start})"
+        qres = run_query(g, "variation_equal", start=Literal(start))
     elif end == None:
-        condition = f"HAVING (COUNT(DISTINCT ?category) >= {start})"
+        qres = run_query(g, "variation_min", start=Literal(start))
     else:
-        condition = f"HAVING (COUNT(DISTINCT ?category) >= {start} && COUNT(DISTINCT ?category) <= {end})"
-
-    num_variation_query = f"""
-    PREFIX nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#> 
-    PREFIX rdaa: <http://rdaregistry.info/Elements/a/> 
-    PREFIX rdai: <http://rdaregistry.info/Elements/i/> 
-    PREFIX rdaio: <http://rdaregistry.info/Elements/i/object/>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
-    PREFIX schema: <https://schema.org/> 
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> 
-
-    SELECT ?annotation_lbl (COUNT(DISTINCT ?category) as ?num_distinct_lbls) (COUNT(?annotation_lbl)/2 as ?num_total_lbls) (MAX(?category) - MIN(?category) as ?range)
-    WHERE {{
-        ?annotation nif:category ?category ;
-            rdfs:label ?annotation_lbl .
-
-        ?word1 nif:annotation ?annotation ;
-            nif:lemma ?lemma ;
-            nif:referenceContext/rdfs:label ?sentence1ID .
-        ?word2 nif:annotation ?annotation ;
-            nif:referenceContext/rdfs:label ?sentence2ID .
-
-        FILTER (isNumeric(?category))
-        FILTER (?sentence1ID != ?sentence2ID)
-    }}
-    GROUP BY ?annotation_lbl
-    {condition}
-    ORDER BY ?num_distinct_lbls ?num_total_lbls ?range ?annotation_lbl
-    """
-
-    qres = g.query(num_variation_query)
-
-    # store results in a csv file
-    qres.serialize(f"./query_results/variation/variations_{start}_{end}.csv", encoding='utf-8', format='csv')
+        qres = run_query(g, "variation_range", start=Literal(start), end=Literal(end))
+
+    # store results in the formats of RESULT_FORMATS
+    store_result(f"variation/variations_{start}_{end}", qres)
     return qres
 
+@profiled("query:get_pos_tags", rows=len)
 def get_pos_tags(g):
     '''
     This query lists the used POS-tags in the graph.
@@ -178,31 +334,16 @@ def get_pos_tags(g):
     @param g: RDF-graph
     @returns qres: the result of the query
     '''
-    pos_query = f"""
-        PREFIX nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#> 
-        PREFIX rdaa: <http://rdaregistry.info/Elements/a/> 
-        PREFIX rdai: <http://rdaregistry.info/Elements/i/> 
-        PREFIX rdaio: <http://rdaregistry.info/Elements/i/object/>
-        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
-        PREFIX schema: <https://schema.org/> 
-        PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> 
-
-        SELECT DISTINCT ?pos
-        WHERE {{
-            ?word nif:posTag ?pos .
-        }}
-        ORDER BY ?pos"""
-
-    qres = g.query(pos_query)
-
-    # store results in a csv file
-    qres.serialize(f"./query_results/pos_tags.csv", encoding='utf-8', format='csv')
+    qres = run_query(g, "pos_tags")
+
+    # store results in the formats of RESULT_FORMATS
+    store_result("pos_tags", qres)
     return qres
 
 
 if __name__ == "__main__":
-    g = rdflib.Graph()
-    g.parse("./graphs/dwug_en.ttl", format='turtle').serialize(format="turtle")
+    # a serialized graph can be given as argument (e.g. graphs/dwug_en.ttl.gz)
+    g = read_kg(sys.argv[1]) if len(sys.argv) > 1 else load_kg()
 
     # some examples
     category_stats(g)
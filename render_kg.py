@@ -0,0 +1,148 @@
+from visualize_kg import create_annotation_pos, draw_instance_graph, plot_annotations, palette_colors, annotation_arrays, color_codes, annotator_mask, RING_SCALES
+from concurrent.futures import ProcessPoolExecutor
+from profiler import profiled
+from rdflib import Graph
+from tqdm import tqdm
+import multiprocessing
+import numpy as np
+import tempfile
+import os
+
+# arrays of the shared inputs in the workers: buffer folder -> dictionary of memory-mapped arrays
+_buffers = dict()
+
+@profiled("prepare_inputs")
+def prepare_inputs(g, color_modes, annotators, buffer_dir):
+    '''
+    This function computes the inputs that all figures share once and stores them as npy files.
+
+    All arrays have one row per label of the annotation table (see visualize_kg.annotation_arrays()):
+    positions.npy: positions of the annotation labels
+    full_xy.npy: positions of the annotation labels in the full visualization (scaled by the ring of their category)
+    colors_{color_mode}.npy: color code of each annotation label
+    members.npy: membership mask (annotators x annotation labels) of the annotation labels of each annotator
+
+    @params
+        g: RDF-graph
+        color_modes: list of the color modes
+        annotators: list of the annotators
+        buffer_dir: folder of the npy files
+    '''
+    xy, category = annotation_arrays(g, create_annotation_pos(g))
+
+    np.save(f"{buffer_dir}/positions.npy", xy)
+    np.save(f"{buffer_dir}/full_xy.npy", xy * np.asarray(RING_SCALES, dtype=xy.dtype)[category][:, None])
+    for color_mode in color_modes:
+        np.save(f"{buffer_dir}/colors_{color_mode}.npy", color_codes(g, color_mode))
+    np.save(f"{buffer_dir}/members.npy", np.array([annotator_mask(g, annotator) for annotator in annotators], dtype=bool).reshape(len(annotators), len(xy)))
+
+def load_buffers(buffer_dir):
+    '''
+    This function maps the shared inputs into the memory of a worker (only once per worker).
+
+    @param buffer_dir: folder of the npy files
+    @returns arrays: dictionary of the memory-mapped arrays
+    '''
+    if buffer_dir not in _buffers:
+        _buffers[buffer_dir] = {os.path.splitext(name)[0]: np.load(f"{buffer_dir}/{name}", mmap_mode="r") for name in os.listdir(buffer_dir)}
+    return _buffers[buffer_dir]
+
+def render_figure(buffer_dir, color_mode, annotator_idx = None, annotator = None):
+    '''
+    This function renders one figure from the shared inputs.
+
+    @params
+        buffer_dir: folder of the shared inputs
+        color_mode: distinct or range
+        annotator_idx: row of the annotator in the membership mask (None: full visualization)
+        annotator: name of the annotator
+    @returns path: path of the stored figure
+    '''
+    arrays = load_buffers(buffer_dir)
+    _, colors = palette_colors(color_mode)
+    codes = arrays[f"colors_{color_mode}"]
+
+    if annotator is None:
+        path = f"./visualizations/full/full_annotations_{color_mode}_dwug_en.png"
+        plot_annotations(arrays["full_xy"], colors[codes], "Full annotation graph", color_mode, path)
+    else:
+        path = f"./visualizations/annotator/{color_mode}/{annotator}_{color_mode}_dwug_en.png"
+        mask = arrays["members"][annotator_idx]
+        plot_annotations(arrays["positions"][mask], colors[codes[mask]], annotator, color_mode, path, annotator=True)
+    return path
+
+def use_agg():
+    '''
+    This function switches the workers to the headless Agg backend of matplotlib.
+    '''
+    import matplotlib
+    matplotlib.use("Agg")
+
+@profiled("render_visualizations")
+def render_visualizations(g, color_modes = ("distinct", "range"), full = True, annotators = (), num_workers = None):
+    '''
+    This function renders the full and the annotator visualizations in parallel.
+
+    The positions, colors and annotator memberships are computed once and shared with the workers as memory-mapped npy files,
+    each worker renders whole figures with the Agg backend.
+
+    @params
+        g: RDF-graph
+        color_modes: list of the color modes (distinct, range)
+        full: whether the full visualization is rendered
+        annotators: list of the annotators whose visualizations are rendered
+        num_workers: number of processes (None: number of cores)
+    @returns paths: list of the stored figures
+    '''
+    figures = [(color_mode, None, None) for color_mode in color_modes if full]
+    figures += [(color_mode, i, annotator) for color_mode in color_modes for i, annotator in enumerate(annotators)]
+
+    with tempfile.TemporaryDirectory() as buffer_dir:
+        prepare_inputs(g, color_modes, list(annotators), buffer_dir)
+
+        if num_workers == 1:
+            paths = [render_figure(buffer_dir, *figure) for figure in tqdm(figures, desc="Rendering visualizations")]
+            _buffers.pop(buffer_dir, None)
+            return paths
+
+        # forked workers do not run the calling script again
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context(start_method), initializer=use_agg) as executor:
+            futures = [executor.submit(render_figure, buffer_dir, *figure) for figure in figures]
+            return [future.result() for future in tqdm(futures, desc="Rendering visualizations")]
+
+def render_instance(triples, path):
+    '''
+    This function draws one instance graph in a worker.
+
+    @params
+        triples: list of the triples of the instance graph
+        path: path of the stored figure
+    @returns path: path of the stored figure
+    '''
+    g = Graph()
+    for triple in triples:
+        g.add(triple)
+    draw_instance_graph(g, path)
+    return path
+
+@profiled("render_instances")
+def render_instances(graphs, paths, num_workers = None):
+    '''
+    This function draws many instance graphs (see visualize_kg.draw_instance_graph()) in parallel.
+
+    The graphs are drawn locally, so a batch of hundreds of word pairs does not wait for any network request.
+
+    @params
+        graphs: list of RDF-graphs
+        paths: list of the paths of the figures
+        num_workers: number of processes (None: number of cores)
+    @returns paths: list of the stored figures
+    '''
+    if num_workers == 1:
+        return [draw_instance_graph(g, path) or path for g, path in tqdm(list(zip(graphs, paths)), desc="Rendering instances")]
+
+    start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context(start_method), initializer=use_agg) as executor:
+        futures = [executor.submit(render_instance, list(g), path) for g, path in zip(graphs, paths)]
+        return [future.result() for future in tqdm(futures, desc="Rendering instances")]
@@ -0,0 +1,225 @@
+from rdflib import Literal, XSD
+from decimal import Decimal
+import os
+
+# pyarrow is optional, it is only imported when a result is stored as Parquet or Arrow IPC (pip install pyarrow)
+
+# number of rows per record batch (Arrow IPC) and row group (Parquet)
+BATCH_SIZE = 65536
+
+# columnar formats by extension: Arrow IPC files can be memory-mapped without any decoding
+COLUMNAR_FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+# integer types of the count columns of the query results, other integer columns are int64
+COLUMN_TYPES = {
+    "num_distinct_lbls": "int8",
+    "num_total_lbls": "int32",
+    "range": "int8",
+    "num_annotated": "int64",
+    "num_distinct_sentence_pairs": "int64",
+    "num_annotators": "int16",
+}
+
+# kinds of the XSD datatypes of literals, literals of other datatypes are stored as strings
+INTEGER_TYPES = {XSD.integer, XSD.int, XSD.long, XSD.short, XSD.byte, XSD.nonNegativeInteger, XSD.positiveInteger, XSD.nonPositiveInteger, XSD.negativeInteger, XSD.unsignedLong, XSD.unsignedInt, XSD.unsignedShort, XSD.unsignedByte}
+FLOAT_TYPES = {XSD.decimal, XSD.double, XSD.float}
+
+def import_pyarrow():
+    '''
+    This function imports pyarrow.
+
+    @returns pa: the pyarrow module
+    '''
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Arrow results need pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+def value_kind(value):
+    '''
+    This function finds the kind of a value of a result row, literals by their datatype.
+
+    @param value: rdflib term or Python value
+    @returns kind: int, float, bool, string or None (missing value)
+    '''
+    if value is None:
+        return None
+    if isinstance(value, Literal):
+        if value.datatype in INTEGER_TYPES:
+            return "int"
+        if value.datatype in FLOAT_TYPES:
+            return "float"
+        if value.datatype == XSD.boolean:
+            return "bool"
+        return "string"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, (float, Decimal)):
+        return "float"
+    # numpy scalars
+    if hasattr(value, "item") and not isinstance(value, str):
+        return value_kind(value.item())
+    return "string"
+
+def column_kind(values):
+    '''
+    This function finds the kind of a column from its values: integers and other numbers give a float column,
+    all other mixtures a string column.
+
+    @param values: iterable of the values of the column
+    @returns kind: int, float, bool, string or None (only missing values)
+    '''
+    kinds = {value_kind(value) for value in values} - {None}
+    if not kinds:
+        return None
+    if len(kinds) == 1:
+        return kinds.pop()
+    if kinds <= {"int", "float"}:
+        return "float"
+    return "string"
+
+def column_value(value, kind):
+    '''
+    This function turns a value of a result row (rdflib term or Python value) into a value of an Arrow column.
+
+    @params
+        value: value of the result row
+        kind: kind of the column (see column_kind())
+    @returns value: int, float, bool, str or None
+    '''
+    if value is None:
+        return None
+    if kind == "string":
+        return str(value)
+    if isinstance(value, Literal):
+        value = value.toPython()
+    elif hasattr(value, "item"):
+        value = value.item()
+    if kind == "int":
+        if isinstance(value, (float, Decimal)) and value != int(value):
+            # numbers are not truncated
+            raise ValueError(f"{value} is not an integer")
+        return int(value)
+    if kind == "float":
+        return float(value)
+    return bool(value)
+
+class ResultSink:
+    '''
+    This class streams result rows in record batches into a Parquet or Arrow IPC file.
+
+    Only one batch of rows is kept in memory. The type of each column is inferred from the first batch (literals by their datatype, see column_kind()):
+    integers are stored with integer types (the count columns with the widths in COLUMN_TYPES), other numbers as float64,
+    so the results can be read (or memory-mapped, see read_result()) without parsing any text.
+    '''
+    def __init__(self, path, fields):
+        import_pyarrow()
+        self.path = path
+        self.fields = list(fields)
+        self.format = COLUMNAR_FORMATS.get(os.path.splitext(path)[1].lower())
+        if self.format is None:
+            raise ValueError(f"unknown result format: {path}")
+        self.kinds = None
+        self.schema = None
+        self.writer = None
+        self.rows = []
+
+    def open(self):
+        '''
+        This function infers the schema from the buffered rows and opens the file.
+        '''
+        pa = import_pyarrow()
+        # columns without any value in the first batch are typed by their name
+        self.kinds = [column_kind(row[i] for row in self.rows) or ("int" if field in COLUMN_TYPES else "string") for i, field in enumerate(self.fields)]
+        arrow_types = {"float": pa.float64(), "bool": pa.bool_(), "string": pa.string()}
+        self.schema = pa.schema([(field, getattr(pa, COLUMN_TYPES.get(field, "int64"))() if kind == "int" else arrow_types[kind]) for field, kind in zip(self.fields, self.kinds)])
+
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(self.path, self.schema)
+
+    def write(self, row):
+        '''
+        This function adds one result row, a full batch is written to the file.
+
+        @param row: values of the row in the order of the fields
+        '''
+        self.rows.append(row)
+        if len(self.rows) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        '''
+        This function writes the buffered rows as one record batch.
+        '''
+        if not self.rows:
+            return
+        if self.writer is None:
+            self.open()
+        pa = import_pyarrow()
+        columns = [pa.array([column_value(row[i], kind) for row in self.rows], type=self.schema.field(i).type) for i, kind in enumerate(self.kinds)]
+        self.writer.write_batch(pa.record_batch(columns, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        '''
+        This function writes the remaining rows and closes the file (an empty result has the schema of its column names).
+        '''
+        try:
+            if self.writer is None:
+                self.open()
+            self.flush()
+        except BaseException:
+            self.discard()
+            raise
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def discard(self):
+        '''
+        This function closes the file without writing the remaining rows and deletes it, so no truncated result is left behind.
+        '''
+        if self.writer is not None:
+            self.writer.close()
+        self.rows = []
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+def write_columnar(path, fields, rows):
+    '''
+    This function streams result rows into a Parquet (.parquet) or Arrow IPC (.arrow, .feather) file.
+
+    @params
+        path: path of the file, the format is chosen from its extension
+        fields: list of the column names
+        rows: iterable of the result rows (tuples, namedtuples or rows of a SPARQL result)
+    '''
+    with ResultSink(path, fields) as sink:
+        for row in rows:
+            sink.write(row)
+
+def read_result(path):
+    '''
+    This function loads a result stored with write_columnar(), Arrow IPC files are memory-mapped.
+
+    @param path: path of the Parquet or Arrow IPC file
+    @returns table: pyarrow Table
+    '''
+    pa = import_pyarrow()
+    if COLUMNAR_FORMATS.get(os.path.splitext(path)[1].lower()) == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
@@ -0,0 +1,435 @@
+from query_kg import VariationRow, CategoryRow, AnnotationRow, variation_rows, collect_annotator_rows
+from annotation_table import get_annotation_table, get_pair_variation
+from sparql_queries import run_query
+from kg_cache import load_kg
+from create_kg import nt_line
+from rdflib import Graph, URIRef, BNode, Literal, XSD
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.paths import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+import threading
+import asyncio
+import json
+import time
+import csv
+import io
+import re
+
+# number of result rows that are encoded and sent together
+CHUNK_SIZE = 1000
+
+# maximal size of a request body in bytes
+MAX_BODY_SIZE = 1 << 20
+
+NAMED_QUERIES = ["category_stats", "annotations_per_annotator", "num_labels", "filter_variation", "pos_tags"]
+
+# federated queries would let the service send requests to other servers
+SERVICE_PATTERN = re.compile(r"\bSERVICE\b", re.IGNORECASE)
+
+_parser_lock = threading.Lock()
+
+# event of the request that the current worker thread evaluates (see produce_chunks() and CancellableGraph)
+_request = threading.local()
+
+class QueryError(Exception):
+    '''
+    This exception is raised for requests that cannot be answered, it carries the HTTP status of the response.
+    '''
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class QueryCancelled(Exception):
+    '''
+    This exception stops a worker whose request has timed out or whose client has disconnected.
+    '''
+
+def named_query(g, name, params):
+    '''
+    This function evaluates one of the queries of query_kg.py without storing the result.
+
+    @params
+        g: CancellableGraph of the service
+        name: name of the query (see NAMED_QUERIES)
+        params: dictionary of the query parameters (start and end for filter_variation, annotator for annotations_per_annotator)
+    @returns
+        header: list of the column names
+        rows: iterable of the result rows
+    '''
+    if name == "category_stats":
+        return CategoryRow._fields, [CategoryRow(*row) for row in get_annotation_table(g).category_stats()]
+    elif name == "num_labels":
+        return VariationRow._fields, variation_rows(g)
+    elif name == "filter_variation":
+        try:
+            start = int(params.get("start", 1))
+            end = int(params["end"]) if "end" in params else None
+        except ValueError:
+            raise QueryError(HTTPStatus.BAD_REQUEST, "start and end have to be integers")
+        return VariationRow._fields, variation_rows(g, start, end)
+    elif name == "annotations_per_annotator":
+        if "annotator" not in params:
+            raise QueryError(HTTPStatus.BAD_REQUEST, "missing parameter: annotator")
+        return AnnotationRow._fields, collect_annotator_rows(g, [params["annotator"]])[params["annotator"]]
+    elif name == "pos_tags":
+        return ["pos"], list(run_query(g, "pos_tags"))
+    raise QueryError(HTTPStatus.NOT_FOUND, f"unknown query: {name}")
+
+class CancellableGraph(Graph):
+    '''
+    This class is a view of a graph whose triple lookups stop when the request is cancelled.
+
+    SPARQL queries and the named queries are evaluated with triple lookups, so a slow query stops shortly after its timeout instead of occupying its worker.
+    The service uses one view for all requests, so the cached tables and results of the view are shared by the requests.
+    Each worker thread checks the event of the request it is evaluating (set by produce_chunks()).
+    The lookups are answered by the graph itself, so a view of several datasets (query_kg.DatasetUnion) keeps its semantics.
+    '''
+    def __init__(self, g):
+        super().__init__(store=g.store, identifier=g.identifier, namespace_manager=g.namespace_manager)
+        self.graph = g
+
+    def triples(self, triple):
+        cancelled = getattr(_request, "cancelled", None)
+        s, p, o = triple
+        # property paths are evaluated with the lookups of the view, so they can be cancelled as well
+        found_triples = super().triples(triple) if isinstance(p, Path) else self.graph.triples(triple)
+        for i, found_triple in enumerate(found_triples):
+            if i % CHUNK_SIZE == 0 and cancelled is not None and cancelled.is_set():
+                raise QueryCancelled()
+            yield found_triple
+
+def sparql_query(g, query_text):
+    '''
+    This function evaluates a read-only SPARQL query.
+
+    Updates cannot be parsed as queries and are rejected, as well as federated queries (SERVICE).
+
+    @params
+        g: CancellableGraph of the service
+        query_text: the SPARQL query
+    @returns qres: the result of the query
+    '''
+    if SERVICE_PATTERN.search(query_text):
+        raise QueryError(HTTPStatus.BAD_REQUEST, "SERVICE is not supported")
+    try:
+        # the parser of rdflib (pyparsing) cannot be used by several threads at the same time
+        with _parser_lock:
+            query = prepareQuery(query_text)
+    except Exception as e:
+        raise QueryError(HTTPStatus.BAD_REQUEST, f"invalid query: {e}")
+    return g.query(query)
+
+def json_term(value):
+    '''
+    This function turns a value of a result row into a term of the SPARQL 1.1 JSON result format.
+
+    @param value: rdflib term or Python value
+    @returns term: dictionary with type and value
+    '''
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, URIRef):
+        return {"type": "uri", "value": str(value)}
+    elif isinstance(value, BNode):
+        return {"type": "bnode", "value": str(value)}
+    elif isinstance(value, Literal):
+        term = {"type": "literal", "value": str(value)}
+        if value.language:
+            term["xml:lang"] = value.language
+        elif value.datatype:
+            term["datatype"] = str(value.datatype)
+        return term
+    elif isinstance(value, bool):
+        return {"type": "literal", "value": str(value).lower(), "datatype": str(XSD.boolean)}
+    elif isinstance(value, int):
+        return {"type": "literal", "value": str(value), "datatype": str(XSD.integer)}
+    elif isinstance(value, float):
+        return {"type": "literal", "value": repr(value), "datatype": str(XSD.double)}
+    return {"type": "literal", "value": str(value)}
+
+def csv_chunks(header, rows):
+    '''
+    This function encodes result rows in the csv format (like qres.serialize()).
+
+    @params
+        header: list of the column names
+        rows: iterable of the result rows
+    @returns chunks: generator of encoded chunks of CHUNK_SIZE rows
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(["" if value is None else str(value) for value in row])
+        if i % CHUNK_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+def json_chunks(header, rows):
+    '''
+    This function encodes result rows in the SPARQL 1.1 JSON result format.
+
+    @params
+        header: list of the column names
+        rows: iterable of the result rows
+    @returns chunks: generator of encoded chunks of CHUNK_SIZE rows
+    '''
+    chunk = [json.dumps({"head": {"vars": list(header)}})[:-1], ', "results": {"bindings": [']
+    for i, row in enumerate(rows):
+        binding = {var: json_term(value) for var, value in zip(header, row) if value is not None}
+        chunk.append(("," if i else "") + json.dumps(binding))
+        if (i + 1) % CHUNK_SIZE == 0:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+    chunk.append("]}}")
+    yield "".join(chunk).encode("utf-8")
+
+def encode_result(result, result_format):
+    '''
+    This function encodes the result of a query.
+
+    @params
+        result: SPARQL result or (header, rows) of a named query
+        result_format: csv or json (graph results are always encoded as N-Triples)
+    @returns
+        content_type: media type of the response
+        chunks: generator of encoded chunks
+    '''
+    if isinstance(result, tuple):
+        header, rows = result
+    elif result.type == "ASK":
+        header, rows = ["boolean"], [(str(result.askAnswer).lower(),)]
+        if result_format == "json":
+            return "application/sparql-results+json", iter([json.dumps({"head": {}, "boolean": result.askAnswer}).encode("utf-8")])
+    elif result.type in ("CONSTRUCT", "DESCRIBE"):
+        return "application/n-triples", (nt_line(triple).encode("utf-8") for triple in result.graph)
+    else:
+        header, rows = [str(var) for var in result.vars], result
+
+    if result_format == "json":
+        return "application/sparql-results+json", json_chunks(header, rows)
+    return "text/csv; charset=utf-8", csv_chunks(header, rows)
+
+def produce_chunks(loop, queue, cancelled, evaluate, result_format):
+    '''
+    This function evaluates a query in a worker thread and passes the encoded chunks to the event loop.
+
+    The queue is bounded, so a worker waits for slow clients instead of buffering the whole result.
+
+    @params
+        loop: event loop of the service
+        queue: asyncio queue that receives the content type, the chunks and finally None (or an exception)
+        cancelled: threading event that is set if the request has timed out or the client has disconnected
+        evaluate: function without arguments that returns the result of the query
+        result_format: csv or json
+    '''
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except FutureTimeoutError:
+                if cancelled.is_set():
+                    future.cancel()
+                    raise QueryCancelled()
+
+    # the triple lookups of the evaluation and of the lazily evaluated rows stop when the request is cancelled
+    _request.cancelled = cancelled
+    try:
+        content_type, chunks = encode_result(evaluate(), result_format)
+        # the response starts with the first chunk, so that errors and timeouts during the evaluation can still be reported
+        first_chunk = next(chunks, b"")
+        put(content_type)
+        put(first_chunk)
+        for chunk in chunks:
+            if cancelled.is_set():
+                raise QueryCancelled()
+            put(chunk)
+        put(None)
+    except QueryCancelled:
+        pass
+    except Exception as e:
+        try:
+            put(e)
+        except QueryCancelled:
+            pass
+    finally:
+        _request.cancelled = None
+
+def parse_request(method, target, headers, body):
+    '''
+    This function finds the query of a request.
+
+    @params
+        method: HTTP method
+        target: request target (path and query string)
+        headers: dictionary of the request headers (lower case names)
+        body: request body
+    @returns
+        name: name of the named query (None for SPARQL queries)
+        params: dictionary of the parameters
+        result_format: csv or json
+    '''
+    url = urlsplit(target)
+    params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+    if method not in ("GET", "POST"):
+        raise QueryError(HTTPStatus.METHOD_NOT_ALLOWED, f"unsupported method: {method}")
+    if method == "POST":
+        content_type = headers.get("content-type", "").split(";")[0].strip()
+        if content_type == "application/x-www-form-urlencoded":
+            params.update({key: values[-1] for key, values in parse_qs(body.decode("utf-8")).items()})
+        elif content_type == "application/sparql-query":
+            params["query"] = body.decode("utf-8")
+        else:
+            raise QueryError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, f"unsupported content type: {content_type}")
+
+    result_format = params.get("format")
+    if result_format is None:
+        result_format = "json" if "json" in headers.get("accept", "") else "csv"
+    if result_format not in ("csv", "json"):
+        raise QueryError(HTTPStatus.NOT_ACCEPTABLE, f"unsupported format: {result_format}")
+
+    if url.path == "/sparql":
+        if "query" not in params:
+            raise QueryError(HTTPStatus.BAD_REQUEST, "missing parameter: query")
+        return None, params, result_format
+    elif url.path.startswith("/queries/"):
+        name = url.path[len("/queries/"):]
+        if name not in NAMED_QUERIES:
+            raise QueryError(HTTPStatus.NOT_FOUND, f"unknown query: {name}")
+        return name, params, result_format
+    raise QueryError(HTTPStatus.NOT_FOUND, f"unknown path: {url.path}")
+
+async def send_error(writer, status, message):
+    '''
+    This function sends a plain text error response.
+
+    @params
+        writer: stream of the connection
+        status: HTTP status
+        message: error message
+    '''
+    body = f"{message}\n".encode("utf-8")
+    writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+
+async def handle_connection(g, executor, timeout, reader, writer):
+    '''
+    This function answers one request: the query is evaluated by the worker pool and the result is streamed with chunked transfer encoding.
+
+    @params
+        g: CancellableGraph of the service
+        executor: worker pool
+        timeout: seconds after which a request is aborted
+        reader, writer: streams of the connection
+    '''
+    deadline = time.monotonic() + timeout
+    cancelled = threading.Event()
+    headers_sent = False
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout)
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = dict()
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        content_length = int(headers.get("content-length", 0))
+        if content_length > MAX_BODY_SIZE:
+            raise QueryError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request body too large")
+        body = await asyncio.wait_for(reader.readexactly(content_length), timeout) if content_length else b""
+
+        name, params, result_format = parse_request(method, target, headers, body)
+        if name is None:
+            evaluate = partial(sparql_query, g, params["query"])
+        else:
+            evaluate = partial(named_query, g, name, params)
+
+        queue = asyncio.Queue(maxsize=8)
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(executor, produce_chunks, loop, queue, cancelled, evaluate, result_format)
+
+        while True:
+            item = await asyncio.wait_for(queue.get(), max(deadline - time.monotonic(), 0))
+            if item is None:
+                break
+            elif isinstance(item, Exception):
+                raise item
+            elif isinstance(item, str):
+                writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {item}\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n".encode("latin-1"))
+                headers_sent = True
+            elif item:
+                writer.write(f"{len(item):x}\r\n".encode("latin-1") + item + b"\r\n")
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+    except QueryError as e:
+        if not headers_sent:
+            await send_error(writer, e.status, str(e))
+    except asyncio.TimeoutError:
+        # a started response is cut off, so that the client notices the incomplete result
+        cancelled.set()
+        if not headers_sent:
+            await send_error(writer, HTTPStatus.GATEWAY_TIMEOUT, f"the query has not finished within {timeout} seconds")
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception as e:
+        if not headers_sent:
+            await send_error(writer, HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+    finally:
+        cancelled.set()
+        writer.close()
+
+async def run_service(g, host, port, num_workers, timeout):
+    '''
+    This function runs the service until it is interrupted.
+
+    @params see serve_kg()
+    '''
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        server = await asyncio.start_server(partial(handle_connection, g, executor, timeout), host, port)
+        print(f"serving the knowledge graph on http://{host}:{port}/sparql and http://{host}:{port}/queries/<name>")
+        async with server:
+            await server.serve_forever()
+
+def serve_kg(g, host = "127.0.0.1", port = 8000, num_workers = 4, timeout = 60):
+    '''
+    This function starts a local HTTP service that answers queries on the loaded graph.
+
+    Endpoints:
+        /sparql?query=...: read-only SPARQL query (SPARQL 1.1 protocol, GET or POST)
+        /queries/<name>?...: one of the NAMED_QUERIES, e.g. /queries/filter_variation?start=2 or /queries/annotations_per_annotator?annotator=annotator1
+    The results are streamed as csv or as SPARQL JSON (format=csv|json or the Accept header), graph results as N-Triples.
+
+    The queries are evaluated by a pool of worker threads, so that a slow query does not block the other requests.
+    A request that takes longer than the timeout is aborted and its worker stops (see CancellableGraph).
+
+    @params
+        g: RDF-graph
+        host: address of the service
+        port: port of the service
+        num_workers: number of queries that are evaluated at the same time
+        timeout: seconds after which a request is aborted
+    '''
+    # all requests use the same view, so its tables and query results are cached across requests
+    view = CancellableGraph(g)
+
+    # build the shared views and parse the registry queries once instead of in the first (concurrent) requests
+    get_pair_variation(view)
+    run_query(view, "pos_tags")
+
+    try:
+        asyncio.run(run_service(view, host, port, num_workers, timeout))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    serve_kg(load_kg())
@@ -0,0 +1,163 @@
+from rdflib.plugins.sparql import prepareQuery
+from rdflib import Literal, XSD
+from collections import OrderedDict
+from functools import lru_cache
+from versioned_store import graph_version
+import profiler
+import threading
+import time
+import weakref
+
+# The queries of query_kg.py and visualize_kg.py. They do not contain any values, the parameters (e.g. ?annotator_name) are bound in run_query().
+PREFIXES = """
+    PREFIX nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#>
+    PREFIX rdaa: <http://rdaregistry.info/Elements/a/>
+    PREFIX rdai: <http://rdaregistry.info/Elements/i/>
+    PREFIX rdaio: <http://rdaregistry.info/Elements/i/object/>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    PREFIX schema: <https://schema.org/>
+    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+    PREFIX hlv_word: <https:/hlv.org/word/>
+"""
+
+VARIATION_QUERY = """
+    SELECT ?annotation_lbl (COUNT(DISTINCT ?category) as ?num_distinct_lbls) (COUNT(?annotation_lbl)/2 as ?num_total_lbls) (MAX(?category) - MIN(?category) as ?range)
+    WHERE {
+        ?annotation nif:category ?category ;
+            rdfs:label ?annotation_lbl .
+
+        ?word1 nif:annotation ?annotation ;
+            nif:lemma ?lemma ;
+            nif:referenceContext/rdfs:label ?sentence1ID .
+        ?word2 nif:annotation ?annotation ;
+            nif:referenceContext/rdfs:label ?sentence2ID .
+
+        FILTER (isNumeric(?category))
+        FILTER (?sentence1ID != ?sentence2ID)
+    }
+    GROUP BY ?annotation_lbl
+    %s
+    ORDER BY ?num_distinct_lbls ?num_total_lbls ?range ?annotation_lbl
+"""
+
+QUERIES = {
+    "category_stats": """
+    SELECT DISTINCT ?category (COUNT(?category) as ?num_annotated) (COUNT(DISTINCT ?annotation_lbl) as ?num_distinct_sentence_pairs) (COUNT(DISTINCT ?annotator) as ?num_annotators) (GROUP_CONCAT(DISTINCT ?annotator; separator=" | ") as ?annotators)
+    WHERE {
+        ?annotation nif:category ?category ;
+            rdfs:label ?annotation_lbl ;
+            rdaio:P40015/rdfs:label ?annotator .
+
+        FILTER(isNumeric(?category))
+    }
+    GROUP BY ?category
+    ORDER BY ?category ?annotators
+    """,
+
+    # parameter: ?annotator_name
+    "annotations_per_annotator": """
+    SELECT DISTINCT ?annotation_lbl ?category (GROUP_CONCAT(?sentencestr; separator=" || ") as ?sentence)
+    WHERE {
+        ?annotator rdfs:label ?annotator_name .
+
+        ?annotation rdaio:P40015 ?annotator;
+            rdfs:label ?annotation_lbl ;
+            nif:category ?category .
+
+        FILTER(!isNumeric(?category))
+
+        ?word nif:annotation ?annotation;
+            nif:referenceContext/nif:isString ?sentencestr .
+
+    }
+    GROUP BY ?annotation
+    ORDER BY ?annotation_lbl ?category ?sentences
+    """,
+
+    "num_labels": VARIATION_QUERY % "",
+
+    # parameters: ?start, ?end
+    "variation_equal": VARIATION_QUERY % "HAVING (COUNT(DISTINCT ?category) = ?start)",
+    "variation_min": VARIATION_QUERY % "HAVING (COUNT(DISTINCT ?category) >= ?start)",
+    "variation_range": VARIATION_QUERY % "HAVING (COUNT(DISTINCT ?category) >= ?start && COUNT(DISTINCT ?category) <= ?end)",
+
+    "pos_tags": """
+        SELECT DISTINCT ?pos
+        WHERE {
+            ?word nif:posTag ?pos .
+        }
+        ORDER BY ?pos""",
+}
+
+# maximal number of results in the result cache
+CACHE_SIZE = 64
+
+# results of this session: (id(graph), version of the graph, query name, bindings) -> (weak reference to the graph, result)
+_results = OrderedDict()
+# the cache is shared by the worker threads of serve_kg.py
+_results_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def get_query(name):
+    '''
+    This function parses and translates a query of the registry (only once per session).
+
+    @param name: name of the query in QUERIES
+    @returns query: the prepared query
+    '''
+    return prepareQuery(PREFIXES + QUERIES[name])
+
+def string_literal(value):
+    '''
+    This function creates a literal in the format of the labels in the graph.
+
+    @param value: label
+    @returns literal: xsd:string literal
+    '''
+    return Literal(value, datatype=XSD.string)
+
+def run_query(g, name, **bindings):
+    '''
+    This function evaluates a query of the registry on a graph.
+
+    Results are cached until the graph changes (see versioned_store.graph_version()), so that repeated calls only evaluate the query once.
+    Results of graphs whose store has no version counter are not cached.
+
+    @params
+        g: RDF-graph
+        name: name of the query in QUERIES
+        bindings: values of the query parameters (rdflib terms)
+    @returns qres: the result of the query
+    '''
+    version = graph_version(g)
+    key = (id(g), version, name, tuple(sorted(bindings.items())))
+    with _results_lock:
+        cached = _results.get(key) if version is not None else None
+        if cached is not None and cached[0]() is g:
+            _results.move_to_end(key)
+            profiler.record_query(name, 0, 0, len(cached[1]), cached=True)
+            return cached[1]
+
+    start = time.perf_counter()
+    query = get_query(name)
+    parsed = time.perf_counter()
+    qres = g.query(query, initBindings=bindings)
+    if qres.type == "SELECT":
+        # evaluate the whole query now so that the cached result can be iterated several times
+        qres.bindings
+    profiler.record_query(name, parsed - start, time.perf_counter() - parsed, len(qres) if profiler.is_enabled() else None)
+
+    if version is None:
+        return qres
+    with _results_lock:
+        _results[key] = (weakref.ref(g), qres)
+        if len(_results) > CACHE_SIZE:
+            _results.popitem(last=False)
+    return qres
+
+def clear_cache():
+    '''
+    This function removes all results from the result cache.
+    '''
+    with _results_lock:
+        _results.clear()
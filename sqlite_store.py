@@ -0,0 +1,268 @@
+from rdflib import Graph, URIRef
+from rdflib.store import Store
+from kg_cache import encode_term, decode_term
+from functools import lru_cache
+import sqlite3
+import uuid
+import os
+
+# size of the SQLite page cache in KiB
+PAGE_CACHE_SIZE = 256 * 1024
+
+# number of terms whose ids and values are kept in memory
+TERM_CACHE_SIZE = 1 << 18
+
+# number of triples fetched from the database at once
+FETCH_SIZE = 10000
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS terms (
+        id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        value TEXT NOT NULL,
+        datatype TEXT NOT NULL,
+        lang TEXT NOT NULL,
+        UNIQUE (kind, value, datatype, lang)
+    );
+    CREATE TABLE IF NOT EXISTS triples (
+        s INTEGER NOT NULL,
+        p INTEGER NOT NULL,
+        o INTEGER NOT NULL,
+        PRIMARY KEY (s, p, o)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS triples_pos ON triples (p, o, s);
+    CREATE INDEX IF NOT EXISTS triples_osp ON triples (o, s, p);
+    CREATE TABLE IF NOT EXISTS namespaces (
+        prefix TEXT PRIMARY KEY,
+        uri TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+"""
+
+def term_row(term):
+    '''
+    This function turns an RDF term into a row of the terms table.
+
+    @param term: URIRef, Literal or BNode
+    @returns row: tuple of kind, value, datatype and language ("" if missing)
+    '''
+    encoded_term = encode_term(term)
+    if encoded_term[0] == "l":
+        return ("l", encoded_term[1], encoded_term[2] or "", encoded_term[3] or "")
+    return (encoded_term[0], encoded_term[1], "", "")
+
+class SQLiteStore(Store):
+    '''
+    This class is an rdflib store that keeps the triples in an SQLite database instead of the memory.
+
+    The triples are stored as term ids with indexes on the SPO, POS and OSP orderings, so every triple pattern is answered by an index.
+    Only the SQLite page cache and a bounded cache of terms are kept in memory.
+    Changes are written in transactions that end with commit().
+    Like versioned_store.VersionedMemory, the store has a version that increases with every change.
+    A commit that contains changes stores a new random revision in the meta table, so files derived from the database can be matched with its content in later sessions.
+    '''
+    context_aware = False
+    formula_aware = False
+    transaction_aware = True
+    graph_aware = False
+
+    def __init__(self, configuration = None, identifier = None):
+        self._connection = None
+        self._num_triples = None
+        self.version = 0
+        super().__init__(configuration, identifier)
+
+    def open(self, configuration, create = True):
+        '''
+        This function opens the database.
+
+        @params
+            configuration: path of the database file
+            create: whether a missing database is created
+        '''
+        if not create and not os.path.isfile(configuration):
+            raise FileNotFoundError(configuration)
+        # the connection is shared by the worker threads of serve_kg.py (SQLite serializes the access)
+        self._connection = sqlite3.connect(configuration, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute(f"PRAGMA cache_size = -{PAGE_CACHE_SIZE}")
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+        self._term_ids = dict()
+        self._terms = lru_cache(maxsize=TERM_CACHE_SIZE)(self._lookup_term)
+        self._num_triples = None
+        self._committed_version = self.version
+
+    def close(self, commit_pending_transaction = False):
+        if self._connection is None:
+            return
+        if commit_pending_transaction:
+            self._connection.commit()
+        else:
+            self._connection.rollback()
+        self._connection.close()
+        self._connection = None
+
+    def commit(self):
+        if self.version != self._committed_version:
+            self.set_meta("revision", uuid.uuid4().hex)
+            self._committed_version = self.version
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+        self._term_ids.clear()
+        self._terms.cache_clear()
+        self._num_triples = None
+        self.version += 1
+        self._committed_version = self.version
+
+    def _lookup_term_id(self, term):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            row = self._connection.execute("SELECT id FROM terms WHERE kind = ? AND value = ? AND datatype = ? AND lang = ?", term_row(term)).fetchone()
+            if row is None:
+                return None
+            term_id = self._cache_term_id(term, row[0])
+        return term_id
+
+    def _cache_term_id(self, term, term_id):
+        if len(self._term_ids) >= TERM_CACHE_SIZE:
+            self._term_ids.clear()
+        self._term_ids[term] = term_id
+        return term_id
+
+    def _lookup_term(self, term_id):
+        kind, value, datatype, lang = self._connection.execute("SELECT kind, value, datatype, lang FROM terms WHERE id = ?", (term_id,)).fetchone()
+        return decode_term((kind, value, datatype or None, lang or None))
+
+    def _term_id(self, term):
+        '''
+        This function returns the id of a term and adds the term to the terms table if it is new.
+
+        @param term: URIRef, Literal or BNode
+        @returns term_id: id of the term
+        '''
+        term_id = self._lookup_term_id(term)
+        if term_id is None:
+            term_id = self._connection.execute("INSERT INTO terms (kind, value, datatype, lang) VALUES (?, ?, ?, ?)", term_row(term)).lastrowid
+            self._cache_term_id(term, term_id)
+        return term_id
+
+    def _pattern(self, triple):
+        '''
+        This function turns a triple pattern into an SQL condition.
+
+        @param triple: (subject, predicate, object) pattern, None matches every term
+        @returns
+            condition: WHERE clause (None if a term of the pattern is not in the store)
+            params: ids of the bound terms
+        '''
+        conditions = []
+        params = []
+        for column, term in zip("spo", triple):
+            if term is None:
+                continue
+            term_id = self._lookup_term_id(term)
+            if term_id is None:
+                return None, params
+            conditions.append(f"{column} = ?")
+            params.append(term_id)
+        return " WHERE " + " AND ".join(conditions) if conditions else "", params
+
+    def add(self, triple, context, quoted = False):
+        self.addN([(*triple, context)])
+
+    def addN(self, quads):
+        self.version += 1
+        rows = ((self._term_id(s), self._term_id(p), self._term_id(o)) for s, p, o, c in quads)
+        self._connection.executemany("INSERT OR IGNORE INTO triples (s, p, o) VALUES (?, ?, ?)", rows)
+        self._num_triples = None
+        self.version += 1
+
+    def remove(self, triple, context = None):
+        condition, params = self._pattern(triple)
+        if condition is None:
+            return
+        self._connection.execute(f"DELETE FROM triples{condition}", params)
+        self._num_triples = None
+        self.version += 1
+
+    def triples(self, triple_pattern, context = None):
+        condition, params = self._pattern(triple_pattern)
+        if condition is None:
+            return
+        cursor = self._connection.execute(f"SELECT s, p, o FROM triples{condition}", params)
+        rows = cursor.fetchmany(FETCH_SIZE)
+        while rows:
+            for s, p, o in rows:
+                yield (self._terms(s), self._terms(p), self._terms(o)), iter(())
+            rows = cursor.fetchmany(FETCH_SIZE)
+
+    def __len__(self, context = None):
+        if self._num_triples is None:
+            self._num_triples = self._connection.execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+        return self._num_triples
+
+    def contexts(self, triple = None):
+        return iter(())
+
+    def bind(self, prefix, namespace, override = True):
+        if not override and self.namespace(prefix) is not None:
+            return
+        self._connection.execute("DELETE FROM namespaces WHERE uri = ?", (str(namespace),))
+        self._connection.execute("INSERT OR REPLACE INTO namespaces (prefix, uri) VALUES (?, ?)", (prefix, str(namespace)))
+
+    def namespace(self, prefix):
+        row = self._connection.execute("SELECT uri FROM namespaces WHERE prefix = ?", (prefix,)).fetchone()
+        return URIRef(row[0]) if row is not None else None
+
+    def prefix(self, namespace):
+        row = self._connection.execute("SELECT prefix FROM namespaces WHERE uri = ?", (str(namespace),)).fetchone()
+        return row[0] if row is not None else None
+
+    def namespaces(self):
+        for prefix, uri in self._connection.execute("SELECT prefix, uri FROM namespaces").fetchall():
+            yield prefix, URIRef(uri)
+
+    def get_meta(self, key):
+        '''
+        This function reads a value of the meta table (e.g. the cache key of the stored graph).
+
+        @param key: name of the value
+        @returns value: the stored string (None if missing)
+        '''
+        row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key, value):
+        '''
+        This function writes a value of the meta table.
+
+        @params
+            key: name of the value
+            value: string
+        '''
+        self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+def open_graph(path, clear = False):
+    '''
+    This function opens a graph that is stored in an SQLite database.
+
+    @params
+        path: path of the database file
+        clear: whether an existing database is replaced by an empty one
+    @returns g: RDF-graph backed by the database
+    '''
+    if clear:
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.isfile(path + suffix):
+                os.remove(path + suffix)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return Graph(store=SQLiteStore(path), bind_namespaces="rdflib")
@@ -0,0 +1,66 @@
+from rdflib import Graph, Dataset
+from rdflib.plugins.stores.memory import Memory
+
+class VersionedMemory(Memory):
+    '''
+    This class is the in-memory store of rdflib with a version counter.
+
+    Every change of the triples increases the version, so data derived from a graph (e.g. query results, annotation tables and views)
+    can be cached until the graph changes, even if a change keeps the number of triples (see graph_version()).
+    '''
+    def __init__(self, configuration = None, identifier = None):
+        super().__init__(configuration, identifier)
+        self.version = 0
+
+    def add(self, triple, context, quoted = False):
+        self.version += 1
+        super().add(triple, context, quoted)
+
+    def addN(self, quads):
+        # increased before and after the triples are added, so a result computed during the insert is not reused
+        self.version += 1
+        add = super().add
+        for s, p, o, c in quads:
+            add((s, p, o), c)
+        self.version += 1
+
+    def remove(self, triple_pattern, context = None):
+        self.version += 1
+        super().remove(triple_pattern, context)
+        self.version += 1
+
+    def add_graph(self, graph):
+        self.version += 1
+        super().add_graph(graph)
+
+    def remove_graph(self, graph):
+        self.version += 1
+        super().remove_graph(graph)
+        self.version += 1
+
+def new_graph():
+    '''
+    This function creates an empty in-memory graph with a version counter.
+
+    @returns g: RDF-graph
+    '''
+    return Graph(store=VersionedMemory(), bind_namespaces="rdflib")
+
+def new_dataset():
+    '''
+    This function creates an empty in-memory Dataset with a version counter.
+
+    @returns ds: Dataset
+    '''
+    return Dataset(store=VersionedMemory())
+
+def graph_version(g):
+    '''
+    This function returns the version of the store of a graph.
+
+    The versions of the in-memory store (VersionedMemory) and the SQLite store (sqlite_store.SQLiteStore) increase with every change.
+
+    @param g: RDF-graph (or a view of a graph that shares its store)
+    @returns version: version of the store (None if the store has no version counter, data derived from the graph is then not cached)
+    '''
+    return getattr(g.store, "version", None)
@@ -1,22 +1,48 @@
-import rdflib
-from rdflib.extras.external_graph_libs import rdflib_to_networkx_graph
-import networkx as nx
-import matplotlib.pyplot as plt
-import requests
-from PIL import Image
-from io import BytesIO
-from query_kg import num_labels
-import os.path
-from csv import DictReader
-from collections import defaultdict
-from matplotlib.lines import Line2D
-import json
+# matplotlib is imported in the functions that need them
+# so that importing this module stays cheap
+from annotation_table import get_annotation_table, get_pair_variation
+from kg_cache import load_kg, read_kg
+from sparql_queries import string_literal
+from layout import Layout, column_layout, load_layout
+from profiler import profiled
 from rdflib.namespace import Namespace, RDFS, RDF, XSD
-import re
-from rdflib import URIRef, Literal
+from rdflib import Literal
 import numpy as np
 from tqdm import tqdm
-
+import sys
+
+ANNOTATOR_COLOR = "#f20c1f" # red
+
+# colors of the annotations per color mode
+PALETTES = {
+    # map colors to the variation labels
+    "distinct": {1: "#168ff2", # blue
+                 2: "#ff7f00", # orange
+                 3: "#1fed18", # green
+                 4: "#f781bf", # pink
+                 5: "#fafa43"}, # yellow
+    # map color to the range of distinct labels
+    "range": {0: "#0730b8", # blue
+              1: "#9e4603", # orange
+              2: "#039c12", # green
+              3: "#cf086f", # pink 
+              4: "#9c038d"} # purple
+}
+
+# lower labels are closer to the center, higher labels further away
+RING_SCALES = [0.25, 0.5, 0.75, 1, 1.25, 1.5]
+
+NIF = Namespace("http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#")
+
+# columns of the instance visualizations from left to right, nodes without these classes (e.g. annotators) are placed next to the nodes that refer to them
+INSTANCE_COLUMNS = [NIF.Context, NIF.Word, NIF.Annotation]
+INSTANCE_COLORS = {NIF.Context: "#d9ecfc", NIF.Word: "#fde3c8", NIF.Annotation: "#d6f5d4"}
+
+# size of the text in the node boxes of the instance visualizations (characters per line, inches per line)
+INSTANCE_LINE_LENGTH = 60
+INSTANCE_LINE_HEIGHT = 0.11
+
+@profiled("visualize:instance")
 def inspect_instance(g, words):
     '''
     This function creates a visualization of the annotations for one word pair.
@@ -26,179 +52,226 @@ def inspect_instance(g, words):
         words: list of the word pair
     @returns instance_graph_rdf: RDF-graph of the annotations for one word pair
     '''
-    instance_query = f"""
-    PREFIX nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#> 
-    PREFIX rdaa: <http://rdaregistry.info/Elements/a/> 
-    PREFIX rdai: <http://rdaregistry.info/Elements/i/> 
-    PREFIX rdaio: <http://rdaregistry.info/Elements/i/object/>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
-    PREFIX schema: <https://schema.org/> 
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> 
-    PREFIX hlv_word: <https:/hlv.org/word/>
-
-    CONSTRUCT {{
-        ?word1 rdfs:label "{words[0]}"^^xsd:string ;
-            ?word1_p ?word1_o ;
-            nif:annotation ?annotation ;
-            nif:referenceContext ?sentence1 .
-
-        ?word2 rdfs:label "{words[1]}"^^xsd:string ;
-            ?word1_p ?word1_o ;
-            nif:annotation ?annotation ;
-            nif:referenceContext ?sentence2 .
-        
-        ?sentence1 ?sentence1_p ?sentence1_o .
-        ?sentence2 ?sentence2_p ?sentence2_o .
-
-        ?annotation ?annotation_p ?annotation_o .
-    }}
-    WHERE {{
-        ?word1 rdfs:label "{words[0]}"^^xsd:string ;
-            ?word1_p ?word1_o ;
-            nif:annotation ?annotation ;
-            nif:referenceContext ?sentence1 .
-
-        ?word2 rdfs:label "{words[1]}"^^xsd:string ;
-            ?word1_p ?word1_o ;
-            nif:annotation ?annotation ;
-            nif:referenceContext ?sentence2 .
-        
-        ?sentence1 ?sentence1_p ?sentence1_o .
-        ?sentence2 ?sentence2_p ?sentence2_o .
-
-        ?annotation ?annotation_p ?annotation_o .
-
-    }}
-    """
-    instance_graph_rdf = g.query(instance_query)
+    instance_graph_rdf = instance_graph(g, words)
 
     # create visualization
-    rdf_grapher_vis(instance_graph_rdf.serialize(format="turtle"), f"./visualizations/instance/{'_'.join(words)}_dwug_en.png")
+    draw_instance_graph(instance_graph_rdf, f"./visualizations/instance/{'_'.join(words)}_dwug_en.png")
     return instance_graph_rdf
 
-def rdf_grapher_vis(g, path):
+@profiled("visualize:instances")
+def inspect_instances(g, pairs, draw = True, num_workers = None):
     '''
-    This function creates a visualization with RDF Grapher.
+    This function creates the visualizations of the annotations for many word pairs.
 
-    @param 
-        g: RDF-graph
-        path: path where the visualization should be stored
+    The subgraphs of the pairs are collected with direct lookups of their nodes (see instance_graph()) instead of one CONSTRUCT query per pair,
+    the visualizations are drawn in parallel (see render_kg.render_instances()).
+
+    @params
+        g: graph
+        pairs: list of word pairs
+        draw: whether the visualizations are drawn (False: only the subgraphs are returned)
+        num_workers: number of processes for the drawing (None: number of cores)
+    @returns instance_graphs: list of the RDF-graphs of the annotations for each word pair
     '''
-    params = {"rdf": g, "from": "ttl", "to": "png"}
-    url = f"http://www.ldf.fi/service/rdf-grapher"
-    r = requests.post(url, params = params)
+    instance_graphs = [instance_graph(g, words) for words in tqdm(pairs, desc="Collecting instances")]
+    if draw:
+        from render_kg import render_instances
+        render_instances(instance_graphs, [f"./visualizations/instance/{'_'.join(words)}_dwug_en.png" for words in pairs], num_workers=num_workers)
+    return instance_graphs
 
-    # print status code because large graphs cannot be parsed (ok: 200)
-    print("status code: ", r.status_code)
+def instance_graph(g, words):
+    '''
+    This function collects the annotations of one word pair.
 
-    # transform into image
-    i = Image.open(BytesIO(r.content))
-    i.show()
-    i.save(path)
+    The nodes of the pair are looked up directly in the indexes of the graph:
+    the words with their shared properties, their sentences and their shared annotations with all their triples.
 
-def create_annotation_subgraph(g):
+    @params
+        g: graph
+        words: list of the word pair
+    @returns instance_graph_rdf: RDF-graph of the annotations for the word pair
     '''
-    This function creates a graph of all annotations in the dataset.
-    
-    @param g: graph
-    @returns annotation_graph_rdf: RDF-graph with all annotations
-    '''
-    annotation_query = f"""
-    PREFIX nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#> 
-    PREFIX rdaa: <http://rdaregistry.info/Elements/a/> 
-    PREFIX rdai: <http://rdaregistry.info/Elements/i/> 
-    PREFIX rdaio: <http://rdaregistry.info/Elements/i/object/>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
-    PREFIX schema: <https://schema.org/> 
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> 
-
-    CONSTRUCT {{
-        ?annotation_lbl nif:category ?category.
-    }}
-    WHERE {{
-        ?annotation rdfs:label ?annotation_lbl ;
-            nif:category ?category.
-
-        FILTER (isNumeric(?category))   
-    }}
-    """
-    annotation_graph_rdf = g.query(annotation_query)
-
-    return annotation_graph_rdf
-
-def create_full_annotation_vis(g, pos, color_dict, color_mode = "distinct"):
+    from create_kg import bind_namespaces
+    from rdflib import Graph
+
+    instance_graph_rdf = Graph()
+    bind_namespaces(instance_graph_rdf)
+
+    word1_lbl, word2_lbl = string_literal(words[0]), string_literal(words[1])
+    for word1 in set(g.subjects(RDFS.label, word1_lbl)):
+        for word2 in set(g.subjects(RDFS.label, word2_lbl)):
+            shared = set(g.predicate_objects(word1)) & set(g.predicate_objects(word2))
+            annotations = {o for p, o in shared if p == NIF.annotation}
+            if not annotations:
+                continue
+
+            for word, word_lbl in ((word1, word1_lbl), (word2, word2_lbl)):
+                instance_graph_rdf.add((word, RDFS.label, word_lbl))
+                for p, o in shared:
+                    instance_graph_rdf.add((word, p, o))
+                for sentence in g.objects(word, NIF.referenceContext):
+                    instance_graph_rdf.add((word, NIF.referenceContext, sentence))
+                    for triple in g.triples((sentence, None, None)):
+                        instance_graph_rdf.add(triple)
+            for annotation in annotations:
+                for triple in g.triples((annotation, None, None)):
+                    instance_graph_rdf.add(triple)
+    return instance_graph_rdf
+
+def annotation_pairs(g, annotation_lbls):
     '''
-    This function visualizes all annotations in the dataset.
+    This function looks up the word pairs of annotations, e.g. of the rows of query_kg.filter_variation().
 
-    @params 
+    @params
         g: graph
-        full_pos: positions of all graph nodes in the visualization
-        color_dict: colors of the nodes
-        color_mode: kind of variation
+        annotation_lbls: list of annotation labels
+    @returns pairs: list of the word pairs (one per annotation label, in the order of the labels)
     '''
-    # collect data
-    annotation_graph_rdf = create_annotation_subgraph(g)
-    annotation_graph_nx = rdflib_to_networkx_graph(annotation_graph_rdf) 
-    lbl2category = {triple[0]:int(triple[2]) for triple in annotation_graph_rdf}
-    annotation_nodes = lbl2category.keys()
-    
-    # color code
-    colors = [color_dict[str(lbl)] for lbl in annotation_nodes]
+    pairs = dict()
+    for annotation_lbl in annotation_lbls:
+        for annotation in g.subjects(RDFS.label, string_literal(annotation_lbl)):
+            words = sorted(str(word_lbl) for word in g.subjects(NIF.annotation, annotation) for word_lbl in g.objects(word, RDFS.label))
+            # the label of the annotation starts with the first word
+            words.sort(key=lambda word: not str(annotation_lbl).startswith(word + "_"))
+            if len(words) == 2:
+                pairs.setdefault(str(annotation_lbl), words)
+                break
+    return list(pairs.values())
+
+def instance_columns(g):
+    '''
+    This function assigns the nodes of an instance graph to the columns of the visualization.
 
-    # lower labels are closer to the center, higher labels further away
-    scales = [0.25, 0.5, 0.75, 1, 1.25, 1.5]
-    scaled_pos = defaultdict(tuple)
-    for lbl, category in lbl2category.items():
-        scaled_pos[lbl] = (pos[lbl][0] * scales[category], pos[lbl][1] * scales[category])
+    The columns contain the sentences, words and annotations, the other nodes (e.g. annotators) are placed in the column after the nodes that refer to them. The words are sorted by their URI,
+    the nodes of the other columns are sorted by the words they are connected to, so that the edges do not cross.
 
-    # plot
-    fig, ax = plt.subplots()
-    fig.suptitle("Full annotation graph")
+    @param g: RDF-graph
+    @returns columns: list of columns (lists of nodes)
+    '''
+    classes = set(g.objects(None, RDF.type))
+    nodes = {node for triple in g for node in (triple[0], triple[2]) if not isinstance(node, Literal) and node not in classes}
+
+    column_idx = dict()
+    for node in nodes:
+        types = set(g.objects(node, RDF.type))
+        column_idx[node] = next((i for i, cls in enumerate(INSTANCE_COLUMNS) if cls in types), None)
+    # nodes without these classes are placed next to the nodes that refer to them
+    for node in nodes:
+        if column_idx[node] is None:
+            column_idx[node] = max((column_idx[s] + 1 for s in g.subjects(None, node) if column_idx.get(s) is not None), default=len(INSTANCE_COLUMNS))
+
+    columns = [[] for _ in range(max(column_idx.values(), default=0) + 1)]
+    for node in sorted(nodes):
+        columns[column_idx[node]].append(node)
+
+    word_rows = {word: i for i, word in enumerate(columns[INSTANCE_COLUMNS.index(NIF.Word)])}
+    def word_row(node):
+        rows = [word_rows[other] for other in set(g.subjects(None, node)) | set(g.objects(node, None)) if other in word_rows]
+        return sum(rows) / len(rows) if rows else len(word_rows)
+    return [column if column is columns[INSTANCE_COLUMNS.index(NIF.Word)] else sorted(column, key=word_row) for column in columns]
+
+def short_name(node, names):
+    '''
+    This function abbreviates a URI with the prefix of its namespace.
 
-    nx.draw_networkx_nodes(annotation_graph_nx, ax=ax, pos=scaled_pos, nodelist = annotation_nodes, node_size=1, node_color=colors, margins=(0.8, 0.8))
+    Unlike normalizeUri(), local names that are not valid in turtle (e.g. the word ids with dots) are abbreviated as well.
 
-    ax.margins(x=0.6, y=0.6)
-    ax.axis('off')
+    @params
+        node: URI
+        names: namespace manager with the prefixes
+    @returns name: prefixed name or the URI in angle brackets
+    '''
+    prefix, namespace = max(((prefix, str(namespace)) for prefix, namespace in names.namespaces() if str(node).startswith(str(namespace))), key=lambda item: len(item[1]), default=(None, ""))
+    return f"{prefix}:{str(node)[len(namespace):]}" if prefix is not None else f"<{node}>"
 
-    fig.legend(handles = get_legend_elements(color_mode), loc="upper right") 
-    plt.tight_layout() 
-    plt.savefig(f"./visualizations/full/full_annotations_{color_mode}_dwug_en.png", format="PNG", dpi=300)
+def instance_box(g, node, names):
+    '''
+    This function lists the lines of the box of one node: its name, its classes and its literals.
+
+    @params
+        g: RDF-graph
+        node: URI of the node
+        names: namespace manager for the prefixed names
+    @returns lines: list of lines
+    '''
+    import textwrap
 
+    lines = [short_name(node, names)]
+    types = sorted(short_name(cls, names) for cls in g.objects(node, RDF.type))
+    if types:
+        lines.append("a " + ", ".join(types))
+    for p, o in sorted((p, o) for p, o in g.predicate_objects(node) if isinstance(o, Literal)):
+        lines.append(textwrap.shorten(f"{short_name(p, names)}: {o}", INSTANCE_LINE_LENGTH, placeholder=" ..."))
+    return lines
 
-def create_annotator_subgraph(g, annotator):
+def draw_instance_graph(g, path):
     '''
-    This function creates a graph of the annotation for one annotator.
-    
+    This function draws an RDF-graph as a node-link diagram and stores it, without any request to an external service.
+
+    Each node is a box with its name, classes and literals, the edges between the nodes are labeled with their properties.
+    The layout is deterministic (see instance_columns() and layout.column_layout()).
+
     @params
+        g: RDF-graph
+        path: path where the visualization should be stored
+    '''
+    import matplotlib.pyplot as plt
+    from create_kg import bind_namespaces
+    from rdflib import Graph
+
+    # prefixes of the graph and of the knowledge graph
+    names = Graph()
+    for prefix, namespace in g.namespaces():
+        names.bind(prefix, namespace)
+    bind_namespaces(names)
+    names = names.namespace_manager
+
+    columns = instance_columns(g)
+    boxes = {node: instance_box(g, node, names) for column in columns for node in column}
+    heights = {node: INSTANCE_LINE_HEIGHT * len(lines) + 0.1 for node, lines in boxes.items()}
+    positions, (width, height) = column_layout([column for column in columns if column], heights)
+
+    fig = plt.figure(figsize=(max(width, 1), max(height, 1)))
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_xlim(0, max(width, 1))
+    ax.set_ylim(0, max(height, 1))
+    ax.axis("off")
+
+    texts = {node: ax.text(*positions[node], "\n".join(lines), ha="center", va="center", fontsize=6, family="monospace", zorder=2,
+                           bbox=dict(boxstyle="round", facecolor=INSTANCE_COLORS.get(next((cls for cls in g.objects(node, RDF.type) if cls in INSTANCE_COLORS), None), "#eeeeee"), edgecolor="#555555"))
+             for node, lines in boxes.items()}
+
+    for s, p, o in sorted(g):
+        if s in texts and o in texts and p != RDF.type:
+            ax.annotate("", xy=(0.5, 0.5), xycoords=texts[o], xytext=(0.5, 0.5), textcoords=texts[s], zorder=3,
+                        arrowprops=dict(arrowstyle="-|>", color="#555555", shrinkA=0, shrinkB=0, patchA=texts[s].get_bbox_patch(), patchB=texts[o].get_bbox_patch()))
+            x = (positions[s][0] + positions[o][0]) / 2
+            y = (positions[s][1] + positions[o][1]) / 2
+            ax.text(x, y, short_name(p, names), ha="center", va="center", fontsize=5, zorder=3, bbox=dict(boxstyle="square,pad=0.1", facecolor="white", edgecolor="none"))
+
+    fig.savefig(path, dpi=150)
+    plt.close(fig)
+
+@profiled("visualize:full")
+def create_full_annotation_vis(g, pos, color_mode = "distinct"):
+    '''
+    This function visualizes all annotations in the dataset.
+
+    @params 
         g: graph
-        annotator: the annotator of the returned annotations
-    @returns annotator_graph_rdf: RDF-graph of the annotations for one annotator
-    '''
-    annotator_query = f"""
-    PREFIX nif: <http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#> 
-    PREFIX rdaa: <http://rdaregistry.info/Elements/a/> 
-    PREFIX rdai: <http://rdaregistry.info/Elements/i/> 
-    PREFIX rdaio: <http://rdaregistry.info/Elements/i/object/>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> 
-    PREFIX schema: <https://schema.org/> 
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> 
-
-    CONSTRUCT {{
-        ?annotation_lbl rdaio:P40015 ?annotator .
-    }}
-    WHERE {{
-        ?annotation rdaio:P40015 ?annotator ;
-            rdfs:label ?annotation_lbl ;
-            nif:category ?category.
-
-        FILTER (isNumeric(?category))
-        ?annotator rdfs:label "{annotator}"^^xsd:string .    
-    }}
-    """
-    annotator_graph_rdf = g.query(annotator_query)
-    return annotator_graph_rdf
-
-def create_single_annotator_vis(g, annotator, pos, color_dict, color_mode = "distinct"):
+        pos: positions of all graph nodes in the visualization
+        color_mode: kind of variation
+    '''
+    xy, category = annotation_arrays(g, pos)
+    _, palette = palette_colors(color_mode)
+
+    # lower labels are closer to the center, higher labels further away
+    scaled_xy = xy * np.asarray(RING_SCALES, dtype=xy.dtype)[category][:, None]
+
+    plot_annotations(scaled_xy, palette[color_codes(g, color_mode)], "Full annotation graph", color_mode, f"./visualizations/full/full_annotations_{color_mode}_dwug_en.png")
+
+@profiled("visualize:annotator")
+def create_single_annotator_vis(g, annotator, pos, color_mode = "distinct"):
     '''
     This function visualizes the annotations of one annotator.
 
@@ -206,131 +279,145 @@ def create_single_annotator_vis(g, annotator, pos, color_dict, color_mode = "dis
         g: the full RDF-graph
         annotator: the annotator who has annotated the visualized annotations
         pos: the positions of the annotation nodes
-        color_dict: the colors of the nodes in the full graph
         color_mode: 
             distinct: colors are defined by the amount of distinct labels for the annotations
             range: colors are defined by the range of distinct labels for the annotations
     '''
-    fig, ax = plt.subplots()
-    fig.suptitle(annotator)
+    xy, _ = annotation_arrays(g, pos)
+    _, palette = palette_colors(color_mode)
+    mask = annotator_mask(g, annotator)
 
-    # collect data
-    annotator_graph_rdf = create_annotator_subgraph(g, annotator)
-    annotator_graph_nx = rdflib_to_networkx_graph(annotator_graph_rdf) 
+    plot_annotations(xy[mask], palette[color_codes(g, color_mode)[mask]], annotator, color_mode, f"./visualizations/annotator/{color_mode}/{annotator}_{color_mode}_dwug_en.png", annotator=True)
 
-    annotator_node = [node for node in annotator_graph_nx.nodes if "annotator" in str(node) and str(node).split("/")[-1] == re.search("\d+", annotator).group()]
+def palette_colors(color_mode):
+    '''
+    This function lists the colors of a color mode, the color codes of color_codes() are indices in this list.
 
-    annotation_nodes = list(set(annotator_graph_nx.nodes)-set(annotator_node)) # exlude annotator node
-    
-    # assign colors
-    colors = [color_dict[str(node)] for node in annotation_nodes]
+    @param color_mode: distinct or range
+    @returns
+        values: the variation value of each color (code - 1)
+        colors: array of the colors (code 0: annotator color for labels without variation value)
+    '''
+    palette = PALETTES[color_mode if color_mode == "range" else "distinct"]
+    return list(palette), np.array([ANNOTATOR_COLOR] + list(palette.values()))
 
-    # plot
-    nx.draw_networkx_nodes(annotator_graph_nx, ax=ax, pos=pos, nodelist = annotation_nodes, node_size=1, node_color=colors, margins=(0.8, 0.8))
-    nx.draw_networkx_nodes(annotator_graph_nx, ax=ax, pos = {annotator_node[0]:np.array([0,0])}, nodelist=annotator_node, node_size=5, node_color = "#f20c1f")
+def annotation_arrays(g, pos):
+    '''
+    This function collects the positions and categories of the annotation labels.
 
-    ax.margins(x=0.6, y=0.6)
-    ax.axis('off')
+    The arrays have one row per label of the annotation table (see annotation_table.AnnotationTable.pair_lbls).
 
-    fig.legend(handles = get_legend_elements(color_mode), loc="upper right") 
-    plt.tight_layout() 
-    plt.savefig(f"./visualizations/annotator/{color_mode}/{annotator}_{color_mode}_dwug_en.png", format="PNG", dpi=300)
+    @params
+        g: RDF-graph
+        pos: Layout (or dictionary) of the node positions
+    @returns
+        xy: array of the positions of the labels
+        category: array of the category of each label (like a dictionary, the last annotation of a label wins)
+    '''
+    table = get_annotation_table(g)
+    nodes = [Literal(lbl, datatype=XSD.string) for lbl in table.pair_lbls]
+    if isinstance(pos, Layout):
+        xy = pos.positions[pos.rows(nodes)]
+    else:
+        xy = np.array([pos[node] for node in nodes], dtype=np.float32).reshape(-1, 2)
+
+    category = np.zeros(len(table.pair_lbls), dtype=np.int64)
+    category[table.pair] = table.category
+    return xy, category
 
-def get_colors(g, color_mode = "distinct"):
+def color_codes(g, color_mode = "distinct"):
     '''
-    This function assigns the colors to the annotations.
+    This function assigns the colors to the annotation labels as indices in the palette of the color mode (see palette_colors()).
 
     @params
         g: RDF-graph
         color_mode: 
             distinct: colors are defined by the amount of distinct labels for the annotations
             range: colors are defined by the range of distinct labels for the annotations
-    @returns color_dict: dictionary mapping the nodes to their colors
-    '''
-    print(f"assigning {color_mode} colors...")
-    if not os.path.isfile(f"./resources/color_dict_{color_mode}.json"):
-        # get range and number of distinct categories
-        num_lbls_file = "./query_results/num_labels.csv"
-        if not os.path.isfile(num_lbls_file):
-            num_labels(g)
-        
-        with open(num_lbls_file, "r", encoding="utf-8") as csv_file:
-            csv_dict = DictReader(csv_file)
-            color_dict = defaultdict(lambda: "#f20c1f") # red
-            # map colors to the variation labels
-            if color_mode != "range":
-                for row in csv_dict:
-                    if row["num_distinct_lbls"] == '1':
-                        color_dict[row["annotation_lbl"]] = "#168ff2" # blue
-                    elif row["num_distinct_lbls"] == '2':
-                        color_dict[row["annotation_lbl"]] = "#ff7f00" # orange
-                    elif row["num_distinct_lbls"] == '3':
-                        color_dict[row["annotation_lbl"]] = "#1fed18" # green
-                    elif row["num_distinct_lbls"] == '4':
-                        color_dict[row["annotation_lbl"]] = "#f781bf" # pink
-                    elif row["num_distinct_lbls"] == '5':
-                        color_dict[row["annotation_lbl"]] = "#fafa43" # yellow
-            else:
-                # map color to the range of distinct labels
-                for row in csv_dict:
-                    if row["range"] == '0':
-                        color_dict[row["annotation_lbl"]] = "#0730b8" # blue
-                    elif row["range"] == '1':
-                        color_dict[row["annotation_lbl"]] = "#9e4603" # orange
-                    elif row["range"] == '2':
-                        color_dict[row["annotation_lbl"]] = "#039c12" # green
-                    elif row["range"] == '3':
-                        color_dict[row["annotation_lbl"]] = "#cf086f" # pink 
-                    elif row["range"] == '4':
-                        color_dict[row["annotation_lbl"]] = "#9c038d" # purple
-
-        # save the color_dict for computational reasons
-        with open(f"./resources/color_dict_{color_mode}.json", 'w', encoding="utf-8") as color_file:
-            json.dump(color_dict, color_file)
-    else:
-        # needs to be initialized to avoid key errors
-        with open(f"./resources/color_dict_{color_mode}.json", 'r', encoding="utf-8") as color_file:
-            color_dict = json.load(color_file)
-        
-    return color_dict
+    @returns codes: array of the color code of each label of the annotation table
+    '''
+    table = get_annotation_table(g)
+    view = get_pair_variation(g)
+    values, _ = palette_colors(color_mode)
+    view_values = view.lbl_range if color_mode == "range" else view.num_distinct_lbls
+
+    # the labels of the table are sorted
+    pair_codes = np.searchsorted(np.array(table.pair_lbls, dtype=str), view.annotation_lbls)
+
+    # lookup table from the variation value to the color code (0 for values without color)
+    lookup = np.zeros(max(max(values), int(view_values.max(initial=0))) + 1, dtype=np.uint8)
+    lookup[values] = np.arange(1, len(values) + 1)
+    codes = np.zeros(len(table.pair_lbls), dtype=np.uint8)
+    codes[pair_codes] = lookup[np.clip(view_values, 0, None)]
+    return codes
+
+def annotator_mask(g, annotator):
+    '''
+    This function selects the annotation labels of one annotator.
+
+    @params
+        g: RDF-graph
+        annotator: name of the annotator
+    @returns mask: boolean array over the labels of the annotation table
+    '''
+    table = get_annotation_table(g)
+    mask = np.zeros(len(table.pair_lbls), dtype=bool)
+    if annotator in table.annotators:
+        mask[table.pair[table.annotator == table.annotators.index(annotator)]] = True
+    return mask
 
-def create_annotation_pos(g):
+def plot_annotations(xy, colors, title, color_mode, path, annotator = False):
+    '''
+    This function draws annotation nodes from their positions and colors and stores the figure.
+
+    @params
+        xy: array of the node positions (one row per node)
+        colors: colors of the nodes
+        title: title of the figure
+        color_mode: kind of variation (for the legend)
+        path: path where the visualization should be stored
+        annotator: whether the annotator node is drawn in the center
+    '''
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    fig.suptitle(title)
+
+    ax.scatter(xy[:, 0], xy[:, 1], s=1, c=colors, marker="o", zorder=2)
+    if annotator:
+        ax.scatter([0], [0], s=5, c=ANNOTATOR_COLOR, marker="o", zorder=2)
+
+    ax.margins(x=0.6, y=0.6)
+    ax.axis('off')
+
+    fig.legend(handles = get_legend_elements(color_mode), loc="upper right") 
+    plt.tight_layout() 
+    plt.savefig(path, format="PNG", dpi=300)
+    plt.close(fig)
+
+@profiled("layout")
+def create_annotation_pos(g, method = "sunflower", seed = 0):
     '''
     This function determines the positions of the nodes in the visualizations.
 
-    @param g: RDF-graph
-    @returns graph_pos: dictionary mapping each node to its position
+    The positions are stored in ./resources/full_graph_pos.npz and computed again if the annotations or annotators of the graph change.
+
+    @params
+        g: RDF-graph
+        method: placement of the nodes on the disc (see layout.disc_layout())
+        seed: seed of the placement
+    @returns graph_pos: Layout mapping each node to its position
     '''
     print("assigning positions...")
-    if not os.path.isfile("./resources/full_graph_pos.json"):
-        # get annotations for the full graph
-        NIF = Namespace("http://persistence.uni-leipzig.org/nlp2rdf/ontologies/nif-core#")
-        RDAIO = Namespace("http://rdaregistry.info/Elements/i/object/")
-
-        annotation_lbls = []
-        for annotation_uri in g.subjects(RDF.type, NIF.Annotation):
-            annotation_lbls += [annotation_lbl for annotation_lbl in g.objects(annotation_uri, RDFS.label)] # annotation label
-            annotation_lbls += [annotator for annotator in g.objects(annotation_uri, RDAIO.P40015)]# annotators
-
-        # assign positions
-        graph_pos = nx.spring_layout(annotation_lbls, k=0.8, seed=0)
-        graph_pos = {node: (p[0] * 2000, p[1] * 2000) for (node, p) in graph_pos.items()}
-
-        with open("./resources/full_graph_pos.json", 'w', encoding="utf-8") as pos_file:
-            json.dump(graph_pos, pos_file)
-    else:
-        # load positions if they are already available
-        with open("./resources/full_graph_pos.json", 'r', encoding="utf-8") as pos_file:
-            pos_json = json.load(pos_file)
-
-            # create Literals and Uris to match the nodes in the subgraphs
-            graph_pos = dict()
-            for node, pos in pos_json.items():
-                if "annotator" not in node:
-                    graph_pos[Literal(node, datatype=XSD.string)] = pos
-                else:
-                    graph_pos[URIRef(node)] = pos
-    return graph_pos
+    RDAIO = Namespace("http://rdaregistry.info/Elements/i/object/")
+
+    # annotation labels and annotators of the full graph
+    nodes = dict()
+    for annotation_uri in g.subjects(RDF.type, NIF.Annotation):
+        nodes.update(dict.fromkeys(g.objects(annotation_uri, RDFS.label)))
+        nodes.update(dict.fromkeys(g.objects(annotation_uri, RDAIO.P40015)))
+
+    return load_layout(list(nodes), "./resources/full_graph_pos.npz", radius=2000, method=method, seed=seed)
 
 def get_legend_elements(color_mode = "distinct"):
     '''
@@ -341,6 +428,8 @@ def get_legend_elements(color_mode = "distinct"):
             range: colors are defined by the range of distinct labels for the annotations
     @returns legend_elements: list of the elements in the legend
     '''
+    from matplotlib.lines import Line2D
+
     legend_elements = []
     if color_mode == "range":
         legend_elements = [
@@ -363,8 +452,8 @@ def get_legend_elements(color_mode = "distinct"):
     return legend_elements
 
 if __name__ == "__main__":
-    g = rdflib.Graph()
-    result = g.parse("./graphs/dwug_en.ttl", format='turtle').serialize(format="turtle")
+    # a serialized graph can be given as argument (e.g. graphs/dwug_en.ttl.gz)
+    g = read_kg(sys.argv[1]) if len(sys.argv) > 1 else load_kg()
     
     #examples
     # inspect a single instance
@@ -373,11 +462,9 @@ if __name__ == "__main__":
 
     # Full visualization 
     pos = create_annotation_pos(g)
-    color_mode = "range"
-    color_dict = get_colors(g, color_mode)
-    create_full_annotation_vis(g, pos, color_dict, color_mode)
+    create_full_annotation_vis(g, pos, color_mode="range")
 
     # Annotator visualization 
     for i in tqdm(range(13), desc="Creating annotator visualizations"):
-        create_single_annotator_vis(g, f"annotator{i}", pos, color_dict, color_mode="distinct")
-        create_single_annotator_vis(g, f"annotator{i}", pos, color_dict, color_mode="range")
+        create_single_annotator_vis(g, f"annotator{i}", pos, color_mode="distinct")
+        create_single_annotator_vis(g, f"annotator{i}", pos, color_mode="range")